@@ -0,0 +1,206 @@
+"""End-to-end check-cycle benchmark against the local fake servers.
+
+Each wantlist size runs in its own subprocess (so peak RSS is per size),
+with the fake servers in a third process so they do not compete with the
+bot for the GIL. A cold cycle populates the database, then a warm cycle is
+measured the way it runs in production, with the notification outbox
+draining alongside it.
+
+    python benchmarks/bench_check_cycle.py --sizes 100,1000,10000,50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+OWNER_CHAT_ID = 1
+
+
+def start_fake_servers(args):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'fake_servers.py'),
+         '--wantlist', str(args.size),
+         '--listings', str(args.listings),
+         '--new-ratio', str(args.new_ratio),
+         '--latency-ms', str(args.latency_ms),
+         '--rate-per-minute', str(args.server_rate),
+         '--telegram-per-second', str(args.telegram_per_second)],
+        stdout=subprocess.PIPE, text=True
+    )
+    urls = dict(proc.stdout.readline().strip().split('=', 1) for _ in range(2))
+    return proc, urls['DISCOGS_API_URL'], urls['TELEGRAM_API_URL']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def timed(stats: dict, name: str, func):
+    async def async_wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            stats.setdefault(name, []).append(time.perf_counter() - start)
+
+    def sync_wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.setdefault(name, []).append(time.perf_counter() - start)
+
+    return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
+
+
+DB_METHODS = (
+    'filter_unseen_listings', 'mark_listings_seen_many', 'enqueue_notifications',
+    'get_pending_notifications', 'mark_notifications_sent',
+)
+
+
+async def run_size(args) -> dict:
+    servers, discogs_url, telegram_url = start_fake_servers(args)
+    workdir = tempfile.mkdtemp(prefix='discoger-bench-')
+    os.chdir(workdir)
+    with open('users.txt', 'w') as f:
+        f.write(f"{OWNER_CHAT_ID}\n")
+
+    os.environ.update({
+        'DISCOGS_TOKEN': 'bench',
+        'DISCOGS_USERNAME': 'bench',
+        'TELEGRAM_BOT_TOKEN': '123:bench',
+        'DISCOGS_API_URL': discogs_url,
+        'TELEGRAM_API_URL': telegram_url,
+        'DISCOGS_REQUESTS_PER_MINUTE': str(args.client_rate),
+        'FETCH_WORKERS': str(args.workers),
+    })
+    import main as discoger
+
+    bot = discoger.DiscogerBot()
+    bot.outbox.per_chat_interval = args.per_chat_interval
+    await bot.bot.app.initialize()
+
+    await bot.check_wantlist()
+    await bot.outbox.drain()
+    httpx.post(f"{telegram_url}/_reset")
+
+    stats = {}
+    bot.discogs.get_new_marketplace_listings = timed(
+        stats, 'release', bot.discogs.get_new_marketplace_listings
+    )
+    for name in DB_METHODS:
+        setattr(bot.db, name, timed(stats, 'db', getattr(bot.db, name)))
+
+    enqueued_at = {}
+    enqueue = bot.db.enqueue_notifications
+
+    def record_enqueue(item, listings, chat_ids=(0,)):
+        now = time.time()
+        for listing in listings:
+            enqueued_at[listing['listing_id']] = now
+        return enqueue(item, listings, chat_ids)
+
+    bot.db.enqueue_notifications = record_enqueue
+
+    sender = asyncio.create_task(bot.outbox.run())
+    start = time.perf_counter()
+    new_listings = await bot.check_wantlist()
+    cycle = time.perf_counter() - start
+
+    while bot.db.get_pending_notifications_count():
+        await asyncio.sleep(0.05)
+    sender.cancel()
+
+    messages = httpx.get(f"{telegram_url}/_messages").json()['messages']
+    discogs_stats = httpx.get(f"{discogs_url}/_stats").json()
+    lags = [
+        message['received_at'] - enqueued_at[listing_id]
+        for message in messages
+        for listing_id in message['listing_ids']
+        if listing_id in enqueued_at
+    ]
+    await bot.bot.app.shutdown()
+    await bot.discogs.close()
+    servers.terminate()
+
+    releases = stats.get('release', [])
+    return {
+        'size': args.size,
+        'cycle_s': cycle,
+        'releases_per_s': len(releases) / cycle if cycle else 0.0,
+        'p50_ms': percentile(releases, 50) * 1000,
+        'p99_ms': percentile(releases, 99) * 1000,
+        'db_s': sum(stats.get('db', [])),
+        'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'new_listings': new_listings,
+        'messages': len(messages),
+        'lag_p50_s': percentile(lags, 50),
+        'lag_p99_s': percentile(lags, 99),
+        'requests': discogs_stats['requests'],
+        'rate_limited': discogs_stats['rejected'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,50000')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--listings', type=int, default=3)
+    parser.add_argument('--new-ratio', type=float, default=0.02)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--server-rate', type=int, default=0,
+                        help="fake Discogs quota per minute (0 = unlimited)")
+    parser.add_argument('--client-rate', type=int, default=1_000_000,
+                        help="DISCOGS_REQUESTS_PER_MINUTE for the bot")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--telegram-per-second', type=float, default=0)
+    parser.add_argument('--per-chat-interval', type=float, default=0)
+    parser.add_argument('--json', help="also write results to this file")
+    args = parser.parse_args()
+
+    if args.size:
+        print(json.dumps(asyncio.run(run_size(args))))
+        return
+
+    results = []
+    passthrough = []
+    for name in ('listings', 'new_ratio', 'latency_ms', 'server_rate', 'client_rate',
+                 'workers', 'telegram_per_second', 'per_chat_interval'):
+        passthrough += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+
+    print(f"{'size':>7} {'cycle s':>9} {'rel/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'db s':>7} {'peak MB':>8} {'new':>6} {'lag p50':>8} {'lag p99':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--size', str(size), *passthrough],
+            capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['size']:>7} {result['cycle_s']:>9.2f} {result['releases_per_s']:>8.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['db_s']:>7.2f} "
+              f"{result['peak_mb']:>8.1f} {result['new_listings']:>6} "
+              f"{result['lag_p50_s']:>8.2f} {result['lag_p99_s']:>8.2f}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Check-cycle database time, per-call connections vs. the shared connection.
+
+Seeds a scratch database with --seen historical listings, then replays the
+DB traffic of one check cycle (cache each wantlist item, look up every
+fetched listing, mark the new ones seen) against both access patterns.
+
+    python benchmarks/bench_db.py --seen 100000 --releases 3000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Database  # noqa: E402
+
+
+class PerCallDatabase:
+    """The pre-WAL access pattern: one connection and one commit per call."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def is_listing_seen(self, release_id, listing_id):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM seen_listings WHERE release_id = ? AND listing_id = ?",
+            (release_id, listing_id)
+        )
+        result = cursor.fetchone()
+        conn.close()
+        return result is not None
+
+    def mark_listing_seen(self, release_id, listing_id, price=None, condition=None,
+                          seller_username=None):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            INSERT OR IGNORE INTO seen_listings
+            (release_id, listing_id, price, condition, seller_username, seen_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (release_id, listing_id, price, condition, seller_username, int(time.time())))
+        conn.commit()
+        conn.close()
+
+    def cache_wantlist_item(self, release_id, artist, title, release_url):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            INSERT OR REPLACE INTO wantlist_cache
+            (release_id, artist, title, release_url, last_checked)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (release_id, artist, title, release_url))
+        conn.commit()
+        conn.close()
+
+
+def seed(db_path: str, seen: int, releases: int):
+    db = Database(db_path)
+    now = int(time.time())
+    rows = (
+        (i % releases, i, "10.00 EUR", "VG+", "seller", now)
+        for i in range(seen)
+    )
+    with db.batch():
+        db.conn.executemany("""
+            INSERT OR IGNORE INTO seen_listings
+            (release_id, listing_id, price, condition, seller_username, seen_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+    db.close()
+
+
+def make_cycle(seen: int, releases: int, per_release: int, new_ratio: float):
+    rng = random.Random(42)
+    next_id = seen
+    cycle = []
+    for release in range(releases):
+        listings = []
+        for _ in range(per_release):
+            if rng.random() < new_ratio:
+                listings.append(str(next_id))
+                next_id += 1
+            else:
+                listings.append(str(rng.randrange(seen // releases) * releases + release))
+        cycle.append((str(release), listings))
+    return cycle
+
+
+def run_cycle(db, cycle) -> int:
+    new = 0
+    for release_id, listings in cycle:
+        db.cache_wantlist_item(release_id, "Artist", "Title", f"https://example/r/{release_id}")
+        for listing_id in listings:
+            if not db.is_listing_seen(release_id, listing_id):
+                db.mark_listing_seen(release_id, listing_id, "12.00 EUR", "NM", "seller")
+                new += 1
+    return new
+
+
+def run_cycle_bulk(db, cycle) -> int:
+    new = 0
+    for release_id, listings in cycle:
+        db.cache_wantlist_item(release_id, "Artist", "Title", f"https://example/r/{release_id}")
+        unseen = db.filter_unseen_listings(release_id, listings)
+        db.mark_listings_seen_many(release_id, [
+            {'listing_id': listing_id, 'price': "12.00 EUR", 'condition': "NM",
+             'seller_username': "seller", 'url': ""}
+            for listing_id in unseen
+        ])
+        new += len(unseen)
+    return new
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seen', type=int, default=100_000)
+    parser.add_argument('--releases', type=int, default=3_000)
+    parser.add_argument('--per-release', type=int, default=5)
+    parser.add_argument('--new-ratio', type=float, default=0.02)
+    args = parser.parse_args()
+
+    cycle = make_cycle(args.seen, args.releases, args.per_release, args.new_ratio)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, 'before.db')
+        after_path = os.path.join(tmp, 'after.db')
+        bulk_path = os.path.join(tmp, 'bulk.db')
+        seed(before_path, args.seen, args.releases)
+        seed(after_path, args.seen, args.releases)
+        seed(bulk_path, args.seen, args.releases)
+
+        conn = sqlite3.connect(before_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+        start = time.perf_counter()
+        new = run_cycle(PerCallDatabase(before_path), cycle)
+        before = time.perf_counter() - start
+
+        db = Database(after_path)
+        start = time.perf_counter()
+        with db.batch():
+            run_cycle(db, cycle)
+        after = time.perf_counter() - start
+        db.close()
+
+        db = Database(bulk_path)
+        start = time.perf_counter()
+        with db.batch():
+            run_cycle_bulk(db, cycle)
+        bulk = time.perf_counter() - start
+        db.close()
+
+    lookups = sum(len(listings) for _, listings in cycle)
+    print(f"seen listings:   {args.seen}")
+    print(f"cycle:           {args.releases} releases, {lookups} lookups, {new} new")
+    print(f"per-call:        {before:8.3f}s")
+    print(f"shared + batch:  {after:8.3f}s  ({before / after:.1f}x)")
+    print(f"bulk diff:       {bulk:8.3f}s  ({before / bulk:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Cold-start benchmark: import profile and time to the first Telegram poll.
+
+First prints where `import main` spends its time, from `python -X
+importtime`, summed per top-level package. Then launches `python main.py`
+against the fake servers several times in the same working directory and
+times launch -> first getUpdates call seen by the fake Telegram server. The
+first run creates the database (unless --seen seeded it); later runs find
+the schema current.
+
+    python benchmarks/bench_startup.py --runs 5 --seen 1000000 --budget-ms 1500
+"""
+import argparse
+import collections
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from bench_check_cycle import start_fake_servers  # noqa: E402
+
+
+def import_profile(top: int):
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    per_package = collections.Counter()
+    total = 0
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        per_package[name.strip().split('.')[0]] += int(self_us)
+        if name == ' main':
+            total = int(cumulative_us)
+    
+    print(f"import main: {total / 1000:.0f} ms")
+    print(f"{'package':>24} {'self ms':>8}")
+    for package, self_us in per_package.most_common(top):
+        print(f"{package:>24} {self_us / 1000:>8.1f}")
+
+
+def seed(db_path: str, seen: int):
+    from database import Database
+    
+    db = Database(db_path)
+    now = int(time.time())
+    with db.lock:
+        db.conn.executemany("""
+            INSERT OR IGNORE INTO seen_listings
+            (release_id, listing_id, price, condition, seller_username, seen_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((i % 5000, i, "10.00 EUR", "VG+", "seller", now) for i in range(seen)))
+        db.conn.commit()
+    db.close()
+
+
+def time_to_first_poll(env: dict, workdir: str, telegram_url: str, timeout: float) -> float:
+    httpx.post(f"{telegram_url}/_reset")
+    launched = time.time()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'main.py')],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.time() - launched < timeout:
+            first_calls = httpx.get(f"{telegram_url}/_messages").json()['first_calls']
+            if "getUpdates" in first_calls:
+                return first_calls['getUpdates'] - launched
+            if proc.poll() is not None:
+                raise RuntimeError(f"main.py exited with {proc.returncode}")
+            time.sleep(0.005)
+        raise RuntimeError(f"no getUpdates within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seen', type=int, default=0,
+                        help="seen listings to seed the database with")
+    parser.add_argument('--budget-ms', type=float, default=0,
+                        help="exit non-zero if the warm median exceeds this")
+    parser.add_argument('--top', type=int, default=12)
+    args = parser.parse_args()
+    
+    import_profile(args.top)
+    
+    fake_args = argparse.Namespace(size=1, listings=1, new_ratio=0, latency_ms=0,
+                                   server_rate=0, telegram_per_second=0)
+    servers, discogs_url, telegram_url = start_fake_servers(fake_args)
+    workdir = tempfile.mkdtemp(prefix='discoger-bench-')
+    with open(os.path.join(workdir, 'users.txt'), 'w') as f:
+        f.write("1\n")
+    if args.seen:
+        seed(os.path.join(workdir, 'discoger.db'), args.seen)
+    
+    env = dict(
+        os.environ,
+        DISCOGS_TOKEN='bench',
+        DISCOGS_USERNAME='bench',
+        TELEGRAM_BOT_TOKEN='123:bench',
+        DISCOGS_API_URL=discogs_url,
+        TELEGRAM_API_URL=telegram_url,
+        WEB_PORT='0',
+    )
+    try:
+        times = [time_to_first_poll(env, workdir, telegram_url, 60) for _ in range(args.runs)]
+    finally:
+        servers.terminate()
+    
+    warm = statistics.median(times[1:]) if len(times) > 1 else times[0]
+    print(f"\nlaunch -> first getUpdates ({args.seen} seen listings)")
+    print(f"  first run: {times[0] * 1000:.0f} ms")
+    print(f"  warm median: {warm * 1000:.0f} ms over {len(times) - 1} runs")
+    if args.budget_ms and warm * 1000 > args.budget_ms:
+        print(f"  over budget of {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Command round-trip benchmark: long-polling + Flask vs webhook mode.
+
+Each mode runs in its own subprocess against the fake Telegram server in a
+third process. The bot sits idle for a while (counting the Bot API calls it
+makes with nothing to do), then answers a series of /help commands one at a
+time; latency is from the fake server queueing the update to it receiving
+the reply.
+
+    python benchmarks/bench_updates.py --commands 200 --idle 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from bench_check_cycle import percentile  # noqa: E402
+
+CHAT_ID = 1
+
+
+def start_fake_telegram():
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'fake_servers.py'), '--wantlist', '1'],
+        stdout=subprocess.PIPE, text=True
+    )
+    urls = dict(proc.stdout.readline().strip().split('=', 1) for _ in range(2))
+    return proc, urls['TELEGRAM_API_URL']
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_mode(args) -> dict:
+    server, telegram_url = start_fake_telegram()
+    os.chdir(tempfile.mkdtemp(prefix='discoger-bench-'))
+    from telegram import Update
+    from bot import TelegramBot
+    from database import Database
+    from webhook import WebhookServer
+    
+    port = free_port()
+    bot = TelegramBot('123:bench', db=Database(), api_url=telegram_url)
+    bot.setup_handlers()
+    webhook = None
+    if args.mode == 'webhook':
+        webhook = WebhookServer(bot.app, f"http://127.0.0.1:{port}", 'bench-secret',
+                                port=port, host='127.0.0.1')
+    else:
+        from keep_alive import keep_alive
+        keep_alive(port)
+    
+    async with bot.app:
+        await bot.app.start()
+        if webhook:
+            await webhook.start()
+        else:
+            await bot.app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        
+        async with httpx.AsyncClient(base_url=telegram_url) as client:
+            await client.post('/_reset')
+            await asyncio.sleep(args.idle)
+            idle_calls = (await client.get('/_messages')).json()['calls']
+            
+            latencies = []
+            for _ in range(args.commands):
+                start = time.perf_counter()
+                await client.post('/_updates', json={'chat_id': CHAT_ID, 'text': '/help'})
+                while len((await client.get('/_messages')).json()['messages']) <= len(latencies):
+                    await asyncio.sleep(0.001)
+                latencies.append(time.perf_counter() - start)
+        
+        threads = threading.active_count()
+        if webhook:
+            await webhook.stop()
+        else:
+            await bot.app.updater.stop()
+        await bot.app.stop()
+    server.terminate()
+    
+    return {
+        'mode': args.mode,
+        'idle_calls_per_min': sum(idle_calls.values()) * 60 / args.idle,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'threads': threads,
+        'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='polling,webhook')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--idle', type=float, default=30,
+                        help="seconds to sit idle before sending commands")
+    args = parser.parse_args()
+    
+    if args.mode:
+        print(json.dumps(asyncio.run(run_mode(args))))
+        return
+    
+    print(f"{'mode':>8} {'idle calls/min':>15} {'p50 ms':>8} {'p99 ms':>8} {'threads':>8} {'peak MB':>8}")
+    for mode in args.modes.split(','):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode,
+             '--commands', str(args.commands), '--idle', str(args.idle)],
+            capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{result['mode']:>8} {result['idle_calls_per_min']:>15.1f} {result['p50_ms']:>8.1f} "
+              f"{result['p99_ms']:>8.1f} {result['threads']:>8} {result['peak_mb']:>8.1f}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""Local stand-ins for the Discogs API and the Telegram Bot API.
+
+Both are plain threaded HTTP/1.1 servers, good enough to drive a full
+DiscogerBot check cycle offline:
+
+    python benchmarks/fake_servers.py --wantlist 1000 --latency-ms 50
+
+then point DISCOGS_API_URL / TELEGRAM_API_URL at the printed URLs.
+GET <discogs>/_stats and GET <telegram>/_messages report what the servers
+saw; POST <telegram>/_reset forgets recorded messages.
+
+POST <telegram>/_updates {"chat_id": 1, "text": "/help"} queues an
+incoming message: it is POSTed to the webhook if the bot set one, and
+otherwise handed out by getUpdates, which long-polls like the real API.
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+import urllib.request
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LISTING_URL = re.compile(r"/sell/item/(\d+)")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length).decode() if length else ""
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(raw or "{}")
+        return {key: values[0] for key, values in parse_qs(raw).items()}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fake, handler):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.fake = fake
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid long-poll are expected, not worth a traceback.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _FakeServer:
+    handler = None
+
+    def start(self):
+        self.server = _Server(self, self.handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+
+class _DiscogsHandler(_Handler):
+    def do_GET(self):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        
+        if url.path == "/_stats":
+            self.send_json(200, {"requests": fake.requests, "rejected": fake.rejected})
+            return
+        
+        allowed, headers = fake.take_token()
+        if not allowed:
+            self.send_json(429, {"message": "You are making requests too quickly."}, headers)
+            return
+        
+        if fake.latency:
+            time.sleep(fake.latency)
+        
+        if re.fullmatch(r"/users/[^/]+/wants", url.path):
+            self.send_json(200, fake.wants_page(int(params.get("page", 1)),
+                                                int(params.get("per_page", 50))), headers)
+        elif url.path == "/marketplace/search":
+            self.send_json(200, fake.listings(params["release_id"], int(params.get("page", 1)),
+                                              int(params.get("per_page", 100))), headers)
+        elif url.path.startswith("/releases/"):
+            self.send_json(200, fake.release(url.path.rsplit("/", 1)[1]), headers)
+        else:
+            self.send_json(404, {"message": "The requested resource was not found."}, headers)
+
+
+class FakeDiscogs(_FakeServer):
+    """Synthetic wantlist of wantlist_size releases with marketplace listings.
+
+    Every release starts with listings_per_release listings. Each later
+    fetch of a release adds a new listing with probability new_ratio, so
+    steady-state cycles find a predictable trickle of new listings.
+    rate_per_minute mimics the authenticated quota, including the
+    X-Discogs-Ratelimit-* headers and 429 responses.
+    """
+
+    handler = _DiscogsHandler
+
+    def __init__(self, wantlist_size: int = 100, listings_per_release: int = 3,
+                 new_ratio: float = 0.02, latency_ms: float = 0, rate_per_minute: int = 0):
+        self.wantlist_size = wantlist_size
+        self.listings_per_release = listings_per_release
+        self.new_ratio = new_ratio
+        self.latency = latency_ms / 1000
+        self.rate_per_minute = rate_per_minute
+        self.lock = threading.Lock()
+        self.fetches = {}
+        self.window = []
+        self.requests = 0
+        self.rejected = 0
+
+    def take_token(self):
+        with self.lock:
+            self.requests += 1
+            if not self.rate_per_minute:
+                return True, {}
+            
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 60]
+            allowed = len(self.window) < self.rate_per_minute
+            if allowed:
+                self.window.append(now)
+            else:
+                self.rejected += 1
+            
+            headers = {
+                "X-Discogs-Ratelimit": self.rate_per_minute,
+                "X-Discogs-Ratelimit-Used": len(self.window),
+                "X-Discogs-Ratelimit-Remaining": self.rate_per_minute - len(self.window),
+            }
+            if not allowed:
+                headers["Retry-After"] = 1
+            return allowed, headers
+
+    def release_ids(self):
+        return [str(1_000_000 + i) for i in range(self.wantlist_size)]
+
+    def wants_page(self, page: int, per_page: int) -> dict:
+        ids = self.release_ids()
+        pages = max(1, -(-len(ids) // per_page))
+        chunk = ids[(page - 1) * per_page:page * per_page]
+        return {
+            "pagination": {"page": page, "pages": pages, "per_page": per_page, "items": len(ids)},
+            "wants": [
+                {
+                    "id": int(release_id),
+                    "date_added": f"2024-01-01T00:00:{i % 60:02d}-00:00",
+                    "basic_information": {
+                        "id": int(release_id),
+                        "title": f"Title {release_id}",
+                        "year": 1970 + int(release_id) % 50,
+                        "artists": [{"name": f"Artist {int(release_id) % 997}"}],
+                    },
+                }
+                for i, release_id in enumerate(chunk)
+            ],
+        }
+
+    def listing_ids(self, release_id: str, page: int = 1):
+        # Later pages of the same scan see the same listings as the first.
+        with self.lock:
+            fetch = self.fetches.get(release_id, 0) + (page == 1)
+            self.fetches[release_id] = fetch
+        
+        base = int(release_id) * 1000
+        ids = [base + i for i in range(self.listings_per_release)]
+        for n in range(2, fetch + 1):
+            if zlib.crc32(f"{release_id}:{n}".encode()) % 10_000 < self.new_ratio * 10_000:
+                ids.append(base + max(100, self.listings_per_release) + n)
+        return sorted(ids, reverse=True)
+
+    def listings(self, release_id: str, page: int, per_page: int) -> dict:
+        ids = self.listing_ids(release_id, page)
+        pages = max(1, -(-len(ids) // per_page))
+        return {
+            "pagination": {"page": page, "pages": pages, "per_page": per_page, "items": len(ids)},
+            "listings": [
+                {
+                    "id": listing_id,
+                    "condition": "Very Good Plus (VG+)",
+                    "sleeve_condition": "Very Good (VG)",
+                    "price": {"value": 10 + listing_id % 40, "currency": "EUR"},
+                    "seller": {"username": f"seller{listing_id % 101}", "stats": {"rating": "99.5"}},
+                    "ships_from": "Germany",
+                    "comments": "",
+                    "uri": f"https://www.discogs.com/sell/item/{listing_id}",
+                }
+                for listing_id in ids[(page - 1) * per_page:page * per_page]
+            ],
+        }
+
+    def release(self, release_id: str) -> dict:
+        return {
+            "id": int(release_id),
+            "title": f"Title {release_id}",
+            "year": 1970 + int(release_id) % 50,
+            "artists": [{"name": f"Artist {int(release_id) % 997}"}],
+            "genres": ["Rock"],
+            "labels": [{"name": "Bench Records"}],
+            "thumb": "",
+        }
+
+
+class _TelegramHandler(_Handler):
+    def do_POST(self):
+        fake = self.server.fake
+        method = self.path.rsplit("/", 1)[-1]
+        body = self.read_body()
+        if not self.path.startswith("/_"):
+            with fake.lock:
+                fake.calls[method] += 1
+                fake.first_calls.setdefault(method, time.time())
+        
+        if self.path == "/_messages":
+            with fake.lock:
+                self.send_json(200, {
+                    "messages": fake.messages,
+                    "flood_responses": fake.flood_responses,
+                    "calls": dict(fake.calls),
+                    "first_calls": fake.first_calls,
+                })
+        elif self.path == "/_reset":
+            with fake.lock:
+                fake.messages = []
+                fake.calls = Counter()
+                fake.first_calls = {}
+            self.send_json(200, {"ok": True})
+        elif self.path == "/_updates":
+            update_id = fake.push_message(int(body.get("chat_id", 1)), body.get("text", "/help"))
+            self.send_json(200, {"ok": True, "update_id": update_id})
+        elif method == "getUpdates":
+            updates = fake.wait_for_updates(int(body.get("offset", 0)), float(body.get("timeout", 0)))
+            self.send_json(200, {"ok": True, "result": updates})
+        elif method == "setWebhook":
+            with fake.lock:
+                fake.webhook = (body.get("url"), body.get("secret_token", ""))
+            self.send_json(200, {"ok": True, "result": True})
+        elif method == "deleteWebhook":
+            with fake.lock:
+                fake.webhook = None
+            self.send_json(200, {"ok": True, "result": True})
+        elif method == "getMe":
+            self.send_json(200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+            }})
+        elif method == "sendMessage":
+            retry_after = fake.flood_check()
+            if retry_after:
+                self.send_json(429, {
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                })
+                return
+            
+            message = fake.record(body)
+            self.send_json(200, {"ok": True, "result": message})
+        else:
+            self.send_json(200, {"ok": True, "result": True})
+
+    do_GET = do_POST
+
+
+class FakeTelegram(_FakeServer):
+    """Bot API stand-in that records every sendMessage with its arrival time.
+
+    max_per_second > 0 answers bursts above that rate with 429 RetryAfter,
+    like Telegram's flood control. Incoming messages from push_message are
+    delivered by webhook once setWebhook was called, else via getUpdates.
+    """
+
+    handler = _TelegramHandler
+
+    def __init__(self, max_per_second: float = 0):
+        self.max_per_second = max_per_second
+        self.lock = threading.Lock()
+        self.updates_ready = threading.Condition(self.lock)
+        self.messages = []
+        self.recent = []
+        self.flood_responses = 0
+        self.calls = Counter()
+        self.first_calls = {}
+        self.webhook = None
+        self.updates = []
+        self.next_update_id = 1
+
+    def push_message(self, chat_id: int, text: str) -> int:
+        with self.lock:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            update = {"update_id": update_id, "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                if text.startswith("/") else [],
+            }}
+            webhook = self.webhook
+            if webhook is None:
+                self.updates.append(update)
+                self.updates_ready.notify_all()
+        if webhook is not None:
+            # Like Telegram, deliver from elsewhere: the caller may be on
+            # the bot's own event loop.
+            threading.Thread(target=self.deliver, args=(webhook, update), daemon=True).start()
+        return update_id
+
+    def deliver(self, webhook: tuple, update: dict):
+        url, secret = webhook
+        request = urllib.request.Request(url, data=json.dumps(update).encode(), headers={
+            "Content-Type": "application/json",
+            "X-Telegram-Bot-Api-Secret-Token": secret,
+        })
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError as e:
+            print(f"webhook delivery of update {update['update_id']} failed: {e}", flush=True)
+
+    def wait_for_updates(self, offset: int, timeout: float) -> list:
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.updates_ready.wait(deadline - time.monotonic())
+            return list(self.updates)
+
+    def flood_check(self) -> int:
+        if not self.max_per_second:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.recent = [t for t in self.recent if now - t < 1]
+            if len(self.recent) >= self.max_per_second:
+                self.flood_responses += 1
+                return 1
+            self.recent.append(now)
+            return 0
+
+    def record(self, body: dict) -> dict:
+        text = body.get("text", "")
+        with self.lock:
+            self.messages.append({
+                "chat_id": int(body.get("chat_id", 0)),
+                "received_at": time.time(),
+                "listing_ids": LISTING_URL.findall(text),
+            })
+            message_id = len(self.messages)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(body.get("chat_id", 0)), "type": "private"},
+            "text": text,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Discogs and Telegram APIs.")
+    parser.add_argument('--wantlist', type=int, default=100)
+    parser.add_argument('--listings', type=int, default=3)
+    parser.add_argument('--new-ratio', type=float, default=0.02)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--rate-per-minute', type=int, default=60)
+    parser.add_argument('--telegram-per-second', type=float, default=0)
+    args = parser.parse_args()
+
+    discogs = FakeDiscogs(args.wantlist, args.listings, args.new_ratio,
+                          args.latency_ms, args.rate_per_minute).start()
+    telegram = FakeTelegram(args.telegram_per_second).start()
+    print(f"DISCOGS_API_URL={discogs.url}")
+    print(f"TELEGRAM_API_URL={telegram.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,74 @@
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.helpers import escape_markdown
 from typing import Callable
+from filters import parse_rule_args, describe_rule
+from price_history import format_cents
 
 logger = logging.getLogger(__name__)
 
+SEARCH_RESULTS = 10
+
 
 class TelegramBot:
-    def __init__(self, token: str, chat_id: int = None):
+    def __init__(self, token: str, db=None, http_cache=None, owner_username: str = None,
+                 api_url: str = None):
         self.token = token
-        self.app = Application.builder().token(token).build()
-        self.chat_id = chat_id
+        self.db = db
+        self.http_cache = http_cache
+        self.owner_username = owner_username
+        
+        builder = Application.builder().token(token)
+        if api_url:
+            builder = builder.base_url(f"{api_url.rstrip('/')}/bot")
+        self.app = builder.build()
         self.check_callback = None
+        self.favorite_callback = None
+        self.filter_callback = None
         
     def set_check_callback(self, callback: Callable):
         self.check_callback = callback
         
+    def set_favorite_callback(self, callback: Callable):
+        self.favorite_callback = callback
+        
+    def set_filter_callback(self, callback: Callable):
+        self.filter_callback = callback
+        
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if self.chat_id is None:
-            self.chat_id = update.effective_chat.id
-            logger.info(f"Chat ID set to: {self.chat_id}")
+        chat_id = update.effective_chat.id
+        await asyncio.to_thread(self.db.add_subscriber, chat_id)
+        if self.owner_username and await asyncio.to_thread(self.db.claim_owner, chat_id, self.owner_username):
+            logger.info(f"Chat {chat_id} subscribed to owner wantlist {self.owner_username}")
+        else:
+            logger.info(f"Chat {chat_id} subscribed")
         
+        await self.help_command(update, context)
+        
+        subscriber = await asyncio.to_thread(self.db.get_subscriber, chat_id)
+        if not subscriber['username']:
+            await update.message.reply_text(
+                "Link your Discogs account with /setuser <discogs username> to start monitoring."
+            )
+    
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "🎵 *Discogs Wantlist Monitor Bot*\n\n"
             "I'll notify you when items from your Discogs wantlist become available for sale!\n\n"
             "*Commands:*\n"
             "/start - Start the bot\n"
+            "/setuser <discogs username> - Monitor this Discogs wantlist\n"
+            "/stop - Stop notifications for this chat\n"
             "/status - Check bot status\n"
             "/check - Manually check wantlist now\n"
+            "/favorite <release id> - Poll a release more often\n"
+            "/unfavorite <release id> - Back to normal polling\n"
+            "/filter [release id] price=30EUR condition=VG+ ships=Germany rating=99 - Only notify matching listings\n"
+            "/filter [release id] clear - Remove a filter\n"
+            "/stats <release id> - Asking prices for a release\n"
+            "/search <words> - Find releases in your wantlist by artist, title, label, genre or year\n"
             "/test - Send a test notification\n"
             "/help - Show this help message\n\n"
             f"Monitoring is active. Checking every {context.bot_data.get('interval', 30)} minutes.",
@@ -35,14 +76,34 @@ class TelegramBot:
         )
     
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        from database import Database
-        db = Database()
-        seen_count = db.get_seen_listings_count()
+        # Handlers run on the event loop; the database lock can be held by
+        # a checkpoint or maintenance, so every call goes to a thread.
+        seen_count = await asyncio.to_thread(self.db.get_seen_listings_count)
+        pending_count = await asyncio.to_thread(self.db.get_pending_notifications_count)
+        subscriber_count = await asyncio.to_thread(self.db.get_subscriber_count)
+        subscriber = await asyncio.to_thread(self.db.get_subscriber, update.effective_chat.id)
+        # Discogs usernames may contain _ or *, which legacy Markdown would
+        # take as an unclosed entity and Telegram would reject the reply.
+        username = 'not set'
+        if subscriber and subscriber['username']:
+            username = escape_markdown(subscriber['username'], version=1)
+        
+        cache_line = ""
+        if self.http_cache:
+            stats = self.http_cache.stats()
+            cache_line = (
+                f"🗄 HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, "
+                f"{stats['misses']} misses ({stats['hit_rate']:.0%})\n"
+            )
         
         await update.message.reply_text(
             f"✅ *Bot Status*\n\n"
             f"🔍 Monitoring: Active\n"
             f"📊 Listings tracked: {seen_count}\n"
+            f"📬 Notifications pending: {pending_count}\n"
+            f"👥 Subscribers: {subscriber_count}\n"
+            f"👤 Discogs user: {username}\n"
+            f"{cache_line}"
             f"⏱ Check interval: {context.bot_data.get('interval', 30)} minutes\n"
             f"💬 Chat ID: {update.effective_chat.id}",
             parse_mode='Markdown'
@@ -57,12 +118,149 @@ class TelegramBot:
             if new_listings == 0:
                 await update.message.reply_text("✅ No new listings found.")
             else:
-                await update.message.reply_text(f"✅ Found and sent {new_listings} new listing(s)!")
+                await update.message.reply_text(f"✅ Found {new_listings} new listing(s), notifications on the way!")
         else:
             await update.message.reply_text("❌ Check function not available.")
     
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await self.start_command(update, context)
+    async def favorite_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self._set_favorite(update, context, True)
+    
+    async def unfavorite_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self._set_favorite(update, context, False)
+    
+    async def _set_favorite(self, update: Update, context: ContextTypes.DEFAULT_TYPE, favorite: bool):
+        if not context.args:
+            command = "favorite" if favorite else "unfavorite"
+            await update.message.reply_text(f"Usage: /{command} <release id>")
+            return
+        
+        if not self.favorite_callback:
+            await update.message.reply_text("❌ Favorites are not available.")
+            return
+        
+        release_id = context.args[0]
+        if await self.favorite_callback(release_id, favorite):
+            state = "⭐ Favorite" if favorite else "Normal polling"
+            await update.message.reply_text(f"{state}: release {release_id}")
+        else:
+            await update.message.reply_text(f"❌ Release {release_id} is not in your wantlist.")
+    
+    async def filter_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        
+        if not context.args:
+            rules = await asyncio.to_thread(self.db.get_filter_rules, chat_id)
+            if not rules:
+                await update.message.reply_text("No filters set. Every new listing is sent.")
+                return
+            lines = [
+                f"{'Release ' + rule['release_id'] if rule['release_id'] else 'All releases'}: {describe_rule(rule)}"
+                for rule in rules
+            ]
+            await update.message.reply_text("🎚 Filters\n\n" + "\n".join(lines))
+            return
+        
+        if not self.filter_callback:
+            await update.message.reply_text("❌ Filters are not available.")
+            return
+        
+        try:
+            release_id, rule = parse_rule_args(context.args)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        
+        target = f"release {release_id}" if release_id else "all releases"
+        if await self.filter_callback(chat_id, release_id, rule):
+            if rule is None:
+                await update.message.reply_text(f"Filter removed for {target}.")
+            else:
+                await update.message.reply_text(f"🎚 Filter for {target}: {describe_rule(rule)}")
+        else:
+            await update.message.reply_text(f"No filter was set for {target}.")
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not context.args:
+            await update.message.reply_text("Usage: /stats <release id>")
+            return
+        
+        release_id = context.args[0]
+        stats = await asyncio.to_thread(self.db.get_release_price_stats, release_id)
+        if not stats:
+            await update.message.reply_text(f"No price data for release {release_id} yet.")
+            return
+        
+        name = f"{stats['artist']} - {stats['title']}" if stats['title'] else f"Release {release_id}"
+        await update.message.reply_text(
+            f"📈 {name}\n\n"
+            f"For sale: {stats['listings']}\n"
+            f"Lowest: {format_cents(stats['min_cents'])}\n"
+            f"Median: {format_cents(stats['median_cents'])}\n"
+            f"Newest listing: {format_cents(stats['last_cents'])}\n"
+            f"Lowest ever seen: {format_cents(stats['all_time_min_cents'])}\n"
+            f"Price changes recorded: {stats['price_changes']}\n\n"
+            f"Prices converted to USD."
+        )
+    
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not context.args:
+            await update.message.reply_text("Usage: /search <artist, title, label, genre or year>")
+            return
+        
+        subscriber = await asyncio.to_thread(self.db.get_subscriber, update.effective_chat.id)
+        if not subscriber or not subscriber['username']:
+            await update.message.reply_text("Link your Discogs account with /setuser <discogs username> first.")
+            return
+        
+        # Answered from the local wantlist cache; Discogs is never asked.
+        query = " ".join(context.args)
+        results = await asyncio.to_thread(
+            self.db.search_wantlist, subscriber['username'], query, SEARCH_RESULTS + 1
+        )
+        if not results:
+            await update.message.reply_text(f"🔎 Nothing in your wantlist matches \"{query}\".")
+            return
+        
+        lines = []
+        for release in results[:SEARCH_RESULTS]:
+            details = " • ".join(
+                str(value) for value in (release['year'], release['label'], release['genres'])
+                if value and value != 'N/A'
+            )
+            lines.append(
+                f"{release['artist']} - {release['title']}\n"
+                f"   {details + ' • ' if details else ''}/stats {release['release_id']}"
+            )
+        reply = f"🔎 \"{query}\"\n\n" + "\n\n".join(lines)
+        if len(results) > SEARCH_RESULTS:
+            reply += f"\n\nShowing the first {SEARCH_RESULTS}; add words to narrow it down."
+        await update.message.reply_text(reply)
+    
+    async def setuser_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not context.args:
+            await update.message.reply_text("Usage: /setuser <discogs username>")
+            return
+        
+        username = context.args[0]
+        if not await asyncio.to_thread(
+            self.db.set_subscriber_username, update.effective_chat.id, username, self.owner_username
+        ):
+            logger.warning(f"Chat {update.effective_chat.id} refused Discogs user {username}: owner wantlist")
+            await update.message.reply_text(
+                "❌ That wantlist is linked to another chat, or this chat holds the bot owner's wantlist."
+            )
+            return
+        
+        logger.info(f"Chat {update.effective_chat.id} linked to Discogs user {username}")
+        await update.message.reply_text(
+            f"✅ Monitoring the wantlist of {username}. "
+            f"It will be loaded within {context.bot_data.get('interval', 30)} minutes."
+        )
+    
+    async def stop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await asyncio.to_thread(self.db.deactivate_subscriber, update.effective_chat.id)
+        logger.info(f"Chat {update.effective_chat.id} unsubscribed")
+        await update.message.reply_text("🔕 Notifications stopped. Send /start to resume.")
     
     async def test_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
@@ -77,25 +275,27 @@ class TelegramBot:
         )
         logger.info(f"Test notification sent to chat {update.effective_chat.id}")
     
-    async def send_notification(self, message: str):
-        if self.chat_id:
-            try:
-                await self.app.bot.send_message(
-                    chat_id=self.chat_id,
-                    text=message,
-                    parse_mode='Markdown',
-                    disable_web_page_preview=False
-                )
-                logger.info("Notification sent successfully")
-            except Exception as e:
-                logger.error(f"Error sending notification: {e}")
-        else:
-            logger.warning("No chat ID set. Cannot send notification.")
+    async def send_notification(self, message: str, chat_id: int):
+        # Errors propagate so the outbox can retry or honour RetryAfter.
+        await self.app.bot.send_message(
+            chat_id=chat_id,
+            text=message,
+            parse_mode='MarkdownV2',
+            disable_web_page_preview=False
+        )
+        logger.info("Notification sent successfully")
     
     def setup_handlers(self):
         self.app.add_handler(CommandHandler("start", self.start_command))
+        self.app.add_handler(CommandHandler("setuser", self.setuser_command))
+        self.app.add_handler(CommandHandler("stop", self.stop_command))
         self.app.add_handler(CommandHandler("status", self.status_command))
         self.app.add_handler(CommandHandler("check", self.check_command))
+        self.app.add_handler(CommandHandler("favorite", self.favorite_command))
+        self.app.add_handler(CommandHandler("unfavorite", self.unfavorite_command))
+        self.app.add_handler(CommandHandler("filter", self.filter_command))
+        self.app.add_handler(CommandHandler("stats", self.stats_command))
+        self.app.add_handler(CommandHandler("search", self.search_command))
         self.app.add_handler(CommandHandler("test", self.test_command))
         self.app.add_handler(CommandHandler("help", self.help_command))
         logger.info("Bot handlers registered")
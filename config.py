@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 import logging
@@ -11,7 +12,55 @@ class Config:
     DISCOGS_TOKEN = os.getenv('DISCOGS_TOKEN')
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     DISCOGS_USERNAME = os.getenv('DISCOGS_USERNAME')
+    # Extra tokens, one scan worker process each; empty scans in-process.
+    DISCOGS_SCAN_TOKENS = [t.strip() for t in os.getenv('DISCOGS_SCAN_TOKENS', '').split(',') if t.strip()]
+    DISCOGS_API_URL = os.getenv('DISCOGS_API_URL', 'https://api.discogs.com')
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+    # Public base URL Telegram can reach; set it to receive updates by
+    # webhook instead of long-polling.
+    TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+    TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+    WEB_PORT = int(os.getenv('WEB_PORT', os.getenv('PORT', '3000')))
+    USERS_FILE = os.getenv('USERS_FILE', 'users.txt')
     CHECK_INTERVAL_MINUTES = int(os.getenv('CHECK_INTERVAL_MINUTES', '30'))
+    POLL_TICK_MINUTES = float(os.getenv('POLL_TICK_MINUTES', '1'))
+    MIN_POLL_MINUTES = float(os.getenv('MIN_POLL_MINUTES', '5'))
+    MAX_POLL_HOURS = float(os.getenv('MAX_POLL_HOURS', '24'))
+    RESUME_FRESHNESS_MINUTES = float(os.getenv('RESUME_FRESHNESS_MINUTES', os.getenv('CHECK_INTERVAL_MINUTES', '30')))
+    POLL_QUOTA_SHARE = float(os.getenv('POLL_QUOTA_SHARE', '0.8'))
+    DISCOGS_REQUESTS_PER_MINUTE = int(os.getenv('DISCOGS_REQUESTS_PER_MINUTE', '60'))
+    FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '4'))
+    # Pages of 100 listings to follow when a release got a burst of new ones.
+    MARKETPLACE_MAX_PAGES = int(os.getenv('MARKETPLACE_MAX_PAGES', '10'))
+    # A sharded cycle gives up once its workers have finished nothing for this long.
+    SCAN_STALL_TIMEOUT_MINUTES = float(os.getenv('SCAN_STALL_TIMEOUT_MINUTES', '10'))
+    WANTLIST_FULL_SYNC_HOURS = float(os.getenv('WANTLIST_FULL_SYNC_HOURS', '24'))
+    HTTP_CACHE_MAX_ENTRIES = int(os.getenv('HTTP_CACHE_MAX_ENTRIES', '10000'))
+    CURRENCY_RATES = os.getenv('CURRENCY_RATES', '')
+    SEEN_RETENTION_DAYS = float(os.getenv('SEEN_RETENTION_DAYS', '180'))
+    PRICE_HISTORY_RETENTION_DAYS = float(os.getenv('PRICE_HISTORY_RETENTION_DAYS', '730'))
+    MAINTENANCE_HOURS = float(os.getenv('MAINTENANCE_HOURS', '24'))
+    SEEN_INDEX_MAX_ENTRIES = int(os.getenv('SEEN_INDEX_MAX_ENTRIES', '5000000'))
+    RELEASE_METADATA_CACHE_ENTRIES = int(os.getenv('RELEASE_METADATA_CACHE_ENTRIES', '2000'))
+    RELEASE_METADATA_TTL_MINUTES = float(os.getenv('RELEASE_METADATA_TTL_MINUTES', '60'))
+    # Release lookups per enrichment run; runs are spaced so they take a
+    # small slice of the quota polling leaves over.
+    ENRICH_BATCH_SIZE = int(os.getenv('ENRICH_BATCH_SIZE', '20'))
+    ENRICH_INTERVAL_MINUTES = float(os.getenv('ENRICH_INTERVAL_MINUTES', '5'))
+    
+    @classmethod
+    def owner_chat_ids(cls) -> list:
+        if not os.path.exists(cls.USERS_FILE):
+            return []
+        with open(cls.USERS_FILE) as f:
+            return [int(line) for line in (l.strip() for l in f) if line.isdigit()]
+    
+    @classmethod
+    def webhook_secret(cls) -> str:
+        # Telegram allows [A-Za-z0-9_-]; derive a stable one from the bot token.
+        if cls.TELEGRAM_WEBHOOK_SECRET:
+            return cls.TELEGRAM_WEBHOOK_SECRET
+        return hashlib.sha256(f"webhook:{cls.TELEGRAM_BOT_TOKEN}".encode()).hexdigest()[:32]
     
     @classmethod
     def validate(cls):
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CycleCoordinator:
+    """Keeps check cycles from overlapping.
+
+    Only one cycle touches Discogs at a time. A full check requested while
+    another is running or queued attaches to that one and gets its result;
+    a scheduled poll that comes due while any cycle is running is dropped,
+    since the next tick picks up whatever is still due.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.full_check: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked() or self.full_check is not None
+
+    async def run_full(self, factory: Callable[[], Awaitable[int]]) -> int:
+        if self.full_check is None:
+            self.full_check = asyncio.create_task(self._run_full(factory))
+        else:
+            metrics.CYCLES_COALESCED.labels('full').inc()
+            logger.info("Full check already in progress, waiting for its result")
+        # Shielded so a caller that goes away (a cancelled /check handler)
+        # does not cancel the scan everyone else is waiting on.
+        return await asyncio.shield(self.full_check)
+
+    async def _run_full(self, factory: Callable[[], Awaitable[int]]) -> int:
+        try:
+            async with self.lock:
+                return await factory()
+        finally:
+            self.full_check = None
+
+    async def run_poll(self, factory: Callable[[], Awaitable[int]]) -> int:
+        if self.busy:
+            metrics.CYCLES_COALESCED.labels('poll').inc()
+            logger.debug("Skipping release poll, another cycle is running")
+            return 0
+        async with self.lock:
+            return await factory()
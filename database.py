@@ -1,121 +1,1440 @@
 import sqlite3
 import json
-from typing import List, Dict, Set
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Set
 import logging
+import metrics
+from seen_index import SeenIndex, pack_key, RELEASE_BITS, LISTING_BITS
+from price_history import observe, price_stats, gone_listing_ids
+from migrations import migrate, SCHEMA_VERSION
+from release_scheduler import HOT_WINDOW_DAYS
 
 logger = logging.getLogger(__name__)
 
+# Stay well under SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds.
+MAX_SQL_VARIABLES = 900
+
+timed = metrics.timed(metrics.DB_OPERATION_SECONDS)
+
 
 class Database:
-    def __init__(self, db_path: str = "discoger.db"):
+    def __init__(self, db_path: str = "discoger.db", seen_index_max: int = 5_000_000,
+                 shared: bool = False, defer_seen_index: bool = False):
         self.db_path = db_path
+        # With several processes writing seen_listings, this process's index
+        # only knows what it loaded or marked itself: a hit is still final,
+        # but a miss has to be confirmed against SQLite.
+        self.shared = shared
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        # Seen-index additions made inside a batch, applied once it commits.
+        self.batch_keys = []
+        self.conn = self.connect()
         self.init_db()
+        self.seen_index = SeenIndex(max_exact=seen_index_max)
+        # Keys marked before the index is loaded, replayed into it on swap.
+        self.seen_index_backlog = []
+        if not defer_seen_index:
+            self.load_seen_index()
+
+    def connect(self) -> sqlite3.Connection:
+        # One connection for the life of the process, shared by whichever
+        # worker thread asyncio.to_thread hands us; self.lock serializes use.
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16000")
+        conn.execute("PRAGMA mmap_size=67108864")
+        return conn
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    @contextmanager
+    def batch(self):
+        """Run everything inside as one transaction, committed when the outermost batch exits.
+
+        Holds self.lock throughout, so no other thread's writes end up in
+        the transaction. An exception rolls the whole transaction back,
+        seen-index additions included, and propagates.
+        """
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.conn.rollback()
+                self.batch_keys = []
+                raise
+            finally:
+                self.batch_depth -= 1
+            
+            if self.batch_depth == 0:
+                self.conn.commit()
+                keys, self.batch_keys = self.batch_keys, []
+                for key in keys:
+                    self._add_to_index(key)
+
+    @timed
+    def _commit(self):
+        if self.batch_depth == 0:
+            self.conn.commit()
 
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS seen_listings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                release_id TEXT NOT NULL,
-                listing_id TEXT NOT NULL,
-                price TEXT,
-                condition TEXT,
-                seller_username TEXT,
-                listing_url TEXT,
-                seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(release_id, listing_id)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS wantlist_cache (
-                release_id TEXT PRIMARY KEY,
-                artist TEXT,
-                title TEXT,
-                release_url TEXT,
-                last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        with self.lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == SCHEMA_VERSION:
+                # Every schema change ships with a migration, so a current
+                # version means everything below already exists.
+                logger.info(f"Database schema is current (version {version})")
+                return
+            
+            cursor = self.conn.cursor()
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS seen_listings (
+                    release_id INTEGER NOT NULL,
+                    listing_id INTEGER NOT NULL,
+                    price TEXT,
+                    condition TEXT,
+                    seller_username TEXT,
+                    seen_at INTEGER NOT NULL,
+                    gone_at INTEGER,
+                    PRIMARY KEY (release_id, listing_id)
+                ) WITHOUT ROWID
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS wantlist_cache (
+                    release_id TEXT PRIMARY KEY,
+                    artist TEXT,
+                    title TEXT,
+                    release_url TEXT,
+                    last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            self._add_missing_columns(cursor, 'wantlist_cache', {
+                'year': 'TEXT',
+                'date_added': 'TEXT',
+                'favorite': 'INTEGER NOT NULL DEFAULT 0',
+                'last_polled_at': 'REAL',
+                'genres': 'TEXT',
+                'label': 'TEXT',
+                'thumb_url': 'TEXT',
+                'enriched_at': 'REAL',
+            })
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS subscribers (
+                    chat_id INTEGER PRIMARY KEY,
+                    discogs_username TEXT,
+                    active INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_wants (
+                    username TEXT NOT NULL,
+                    release_id TEXT NOT NULL,
+                    date_added TEXT,
+                    PRIMARY KEY (username, release_id)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_wants_release 
+                ON user_wants(release_id)
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    id INTEGER PRIMARY KEY,
+                    chat_id INTEGER NOT NULL DEFAULT 0,
+                    release_id TEXT NOT NULL,
+                    listing_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(chat_id, release_id, listing_id)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_outbox_pending 
+                ON notification_outbox(status, next_attempt_at)
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS listing_prices (
+                    release_id INTEGER NOT NULL,
+                    listing_id INTEGER NOT NULL,
+                    price_cents INTEGER NOT NULL,
+                    currency TEXT,
+                    condition INTEGER NOT NULL,
+                    PRIMARY KEY (release_id, listing_id)
+                ) WITHOUT ROWID
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS price_history (
+                    listing_id INTEGER NOT NULL,
+                    observed_at INTEGER NOT NULL,
+                    release_id INTEGER NOT NULL,
+                    price_cents INTEGER NOT NULL,
+                    currency TEXT,
+                    condition INTEGER NOT NULL,
+                    PRIMARY KEY (listing_id, observed_at)
+                ) WITHOUT ROWID
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_price_history_release 
+                ON price_history(release_id, observed_at)
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS release_price_stats (
+                    release_id INTEGER PRIMARY KEY,
+                    listings INTEGER NOT NULL,
+                    min_cents INTEGER,
+                    median_cents INTEGER,
+                    last_cents INTEGER,
+                    all_time_min_cents INTEGER,
+                    updated_at INTEGER NOT NULL
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS filter_rules (
+                    chat_id INTEGER NOT NULL,
+                    release_id TEXT NOT NULL DEFAULT '',
+                    max_price REAL,
+                    currency TEXT,
+                    min_condition TEXT,
+                    ships_from TEXT,
+                    min_seller_rating REAL,
+                    PRIMARY KEY (chat_id, release_id)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scan_queue (
+                    release_id TEXT PRIMARY KEY,
+                    cycle_id INTEGER,
+                    item TEXT NOT NULL,
+                    chat_ids TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    worker TEXT,
+                    lease_until REAL,
+                    new_listings INTEGER,
+                    enqueued_at REAL NOT NULL
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scan_queue_status 
+                ON scan_queue(status, enqueued_at)
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS check_cycles (
+                    cycle_id INTEGER PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    started_at REAL NOT NULL,
+                    finished_at REAL,
+                    releases_total INTEGER NOT NULL DEFAULT 0,
+                    releases_done INTEGER NOT NULL DEFAULT 0,
+                    new_listings INTEGER NOT NULL DEFAULT 0,
+                    last_release_id TEXT
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_http_cache_last_used 
+                ON http_cache(last_used)
+            """)
+            
+            self.conn.commit()
+            version = migrate(self.conn)
+        logger.info(f"Database initialized (schema version {version})")
+
+    def _add_missing_columns(self, cursor, table: str, columns: Dict[str, str]):
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, col_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+    def _delete_in_batches(self, table: str, key: str, where: str, params: tuple,
+                           batch_size: int = 5000) -> int:
+        # Short transactions so scans and the outbox are never stalled
+        # behind one huge delete.
+        deleted = 0
+        while True:
+            with self.lock:
+                cursor = self.conn.execute(f"""
+                    DELETE FROM {table} WHERE ({key}) IN (
+                        SELECT {key} FROM {table} WHERE {where} LIMIT ?
+                    )
+                """, (*params, batch_size))
+                self._commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+    def run_maintenance(self, seen_retention_days: float, history_retention_days: float,
+                        now: float = None) -> Dict:
+        """Apply retention, hand freed pages back to the OS and refresh planner stats.
+
+        Deleted seen rows stay in the in-memory seen index until the next
+        restart. record_prices clears gone_at when a listing is relisted,
+        so only one that reappears after its row was deleted is affected:
+        it counts as seen until the restart and as new after it.
+        """
+        now = int(now or time.time())
+        stats = {
+            'seen_listings': self._delete_in_batches(
+                'seen_listings', 'release_id, listing_id', 'gone_at < ?',
+                (now - int(seen_retention_days * 86400),)
+            ),
+            'price_history': self._delete_in_batches(
+                'price_history', 'listing_id, observed_at', 'observed_at < ?',
+                (now - int(history_retention_days * 86400),)
+            ),
+            'activity_days': self._delete_in_batches(
+                'release_new_daily', 'release_id, day', 'day < ?',
+                ((now - HOT_WINDOW_DAYS * 86400) // 86400,)
+            ),
+            'failed_notifications': self._delete_in_batches(
+                'notification_outbox', 'id', "status = 'failed' AND next_attempt_at < ?",
+                (now - 30 * 86400,)
+            ),
+        }
         
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized")
+        with self.lock:
+            self._commit()
+            freed = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+            # Runs ANALYZE only on tables whose stats have drifted.
+            self.conn.execute("PRAGMA optimize")
+        stats['pages_freed'] = freed
+        return stats
 
-    def is_listing_seen(self, release_id: str, listing_id: str) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_state(self, key: str, default: str = None) -> str:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT value FROM bot_state WHERE key = ?", (key,))
+            result = cursor.fetchone()
+        return result[0] if result else default
+
+    def set_state(self, key: str, value: str):
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)
+            """, (key, value))
+            self._commit()
+
+    def load_seen_index(self):
+        """Build the seen index from seen_listings.
+
+        Reads on a connection of its own and builds the index without
+        holding self.lock, so with defer_seen_index it can run in a thread
+        while the bot starts. Until it is swapped in, lookups go to SQLite.
+        """
+        # Packed the way pack_key does it. Primary-key order is packed-key
+        # order, so rows stream into the index already sorted and unique,
+        # and the ORDER BY costs SQLite nothing.
+        index = SeenIndex(max_exact=self.seen_index.max_exact, error_rate=self.seen_index.error_rate)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            row = conn.execute("SELECT count FROM table_counts WHERE name = 'seen_listings'").fetchone()
+            cursor = conn.execute(f"""
+                SELECT release_id << {LISTING_BITS} | listing_id FROM seen_listings
+                WHERE typeof(release_id) = 'integer' AND typeof(listing_id) = 'integer'
+                  AND release_id >= 0 AND release_id < {1 << RELEASE_BITS}
+                  AND listing_id >= 0 AND listing_id < {1 << LISTING_BITS}
+                ORDER BY release_id, listing_id
+            """)
+            index.load((key for key, in cursor), row[0] if row else None)
+        finally:
+            conn.close()
         
-        cursor.execute("""
-            SELECT 1 FROM seen_listings 
-            WHERE release_id = ? AND listing_id = ?
-        """, (release_id, listing_id))
+        with self.lock:
+            for key in self.seen_index_backlog:
+                index.add(key)
+            self.seen_index = index
+            self.seen_index_backlog = []
         
-        result = cursor.fetchone()
-        conn.close()
+        logger.info(
+            f"Seen index loaded: {self.seen_index.count} listings, "
+            f"{self.seen_index.memory_bytes() / 1e6:.1f} MB"
+            f"{'' if self.seen_index.exact else ' (Bloom filter only)'}"
+        )
+
+    def is_listing_seen(self, release_id: str, listing_id: str) -> bool:
+        key = pack_key(release_id, listing_id)
         
-        return result is not None
+        with self.lock:
+            known = self.seen_index.lookup(key) if key is not None else None
+            if known or (known is False and not self.shared):
+                return known
+            
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT 1 FROM seen_listings 
+                WHERE release_id = ? AND listing_id = ?
+            """, (release_id, listing_id))
+            
+            return cursor.fetchone() is not None
 
     def mark_listing_seen(self, release_id: str, listing_id: str, 
                          price: str = None, condition: str = None,
-                         seller_username: str = None, listing_url: str = None):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+                         seller_username: str = None):
+        with self.lock:
+            try:
+                self.conn.execute("""
+                    INSERT OR IGNORE INTO seen_listings 
+                    (release_id, listing_id, price, condition, seller_username, seen_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (release_id, listing_id, price, condition, seller_username, int(time.time())))
+                
+                self._commit()
+                self._index(release_id, listing_id)
+                logger.debug(f"Marked listing {listing_id} for release {release_id} as seen")
+            except Exception as e:
+                logger.error(f"Error marking listing as seen: {e}")
+
+    @timed
+    def filter_unseen_listings(self, release_id: str, listing_ids: List[str]) -> List[str]:
+        if not listing_ids:
+            return []
         
-        try:
+        seen = set()
+        unknown = []
+        with self.lock:
+            for listing_id in listing_ids:
+                key = pack_key(release_id, listing_id)
+                known = self.seen_index.lookup(key) if key is not None else None
+                if known:
+                    seen.add(listing_id)
+                elif known is None or self.shared:
+                    unknown.append(listing_id)
+            
+            cursor = self.conn.cursor()
+            for start in range(0, len(unknown), MAX_SQL_VARIABLES):
+                chunk = unknown[start:start + MAX_SQL_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(f"""
+                    SELECT listing_id FROM seen_listings 
+                    WHERE release_id = ? AND listing_id IN ({placeholders})
+                """, (release_id, *chunk))
+                found = [str(row[0]) for row in cursor.fetchall()]
+                seen.update(found)
+                if self.shared:
+                    # Marked by another process; remember it here too.
+                    for listing_id in found:
+                        self._index(release_id, listing_id)
+        
+        return [listing_id for listing_id in listing_ids if listing_id not in seen]
+
+    @timed
+    def reached_seen_listings(self, release_id: str, listing_ids: List[str]) -> bool:
+        """Whether paging newest-first can stop at this page of listings.
+
+        It can once any of them was seen before. A release with no seen
+        listings at all is on its first scan, which only takes the newest
+        page rather than paging through its whole back catalogue.
+        """
+        if len(self.filter_unseen_listings(release_id, listing_ids)) < len(listing_ids):
+            return True
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM seen_listings WHERE release_id = ? LIMIT 1", (release_id,)
+            ).fetchone()
+        return row is None
+
+    @timed
+    def mark_listings_seen_many(self, release_id: str, listings: List[Dict]):
+        if not listings:
+            return
+        
+        seen_at = int(time.time())
+        rows = [
+            (release_id, listing['listing_id'], listing.get('price'), listing.get('condition'),
+             listing.get('seller_username'), seen_at)
+            for listing in listings
+        ]
+        with self.lock:
+            try:
+                self.conn.executemany("""
+                    INSERT OR IGNORE INTO seen_listings 
+                    (release_id, listing_id, price, condition, seller_username, seen_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+                
+                self._commit()
+                for row in rows:
+                    self._index(release_id, row[1])
+                logger.debug(f"Marked {len(rows)} listings for release {release_id} as seen")
+            except Exception as e:
+                if self.batch_depth:
+                    # Let the batch roll back rather than commit its
+                    # notifications without the seen marks.
+                    raise
+                logger.error(f"Error marking listings as seen: {e}")
+
+    @timed
+    def enqueue_notifications(self, item: Dict, listings: List[Dict], chat_ids: List[int] = (0,)):
+        """Queue listings for every chat; chat 0 holds them until an owner chat exists."""
+        if not listings:
+            return
+        
+        rows = [
+            (chat_id, item['release_id'], listing['listing_id'],
+             json.dumps({'item': item, 'listing': listing}))
+            for listing in listings
+            for chat_id in (chat_ids or (0,))
+        ]
+        with self.lock:
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO notification_outbox 
+                (chat_id, release_id, listing_id, payload)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            self._commit()
+
+    @timed
+    def record_release_scan(self, item: Dict, listings: List[Dict], chat_ids: List[int] = (0,),
+                            cycle_id: int = None, polled_at: float = None,
+                            listing_filter=None, claimed: bool = False,
+                            rates: Dict[str, float] = None, complete: bool = None) -> List[Dict]:
+        """Checkpoint one polled release and return its new listings.
+
+        Seen marks, queued notifications, the release's last_polled_at and the
+        cycle's progress are committed together, so a restart never loses a
+        listing that was already marked seen nor re-fetches a finished release.
+        batch() holds self.lock from the unseen filter through the seen
+        marks, so two scans of the same release cannot both find a listing
+        new; the outbox's unique (chat, listing) key backs that up.
+        """
+        release_id = item['release_id']
+        polled_at = polled_at or time.time()
+        
+        with self.batch():
+            unseen_ids = set(self.filter_unseen_listings(
+                release_id, [listing['listing_id'] for listing in listings]
+            ))
+            new_listings = [l for l in listings if l['listing_id'] in unseen_ids]
+            
+            # Filtered-out listings are still marked seen, so a rule that is
+            # loosened later only affects listings posted after it.
+            if listing_filter and new_listings:
+                matched = listing_filter.apply(chat_ids or (0,), release_id, new_listings)
+                for chat_id, chat_listings in matched.items():
+                    self.enqueue_notifications(item, chat_listings, [chat_id])
+            else:
+                self.enqueue_notifications(item, new_listings, chat_ids)
+            self.mark_listings_seen_many(release_id, new_listings)
+            if rates is not None:
+                self.record_prices(release_id, listings, rates, polled_at, complete)
+            
+            with self.lock:
+                self.conn.execute(
+                    "UPDATE wantlist_cache SET last_polled_at = ? WHERE release_id = ?",
+                    (polled_at, release_id)
+                )
+                if cycle_id is not None:
+                    self.conn.execute("""
+                        UPDATE check_cycles 
+                        SET releases_done = releases_done + 1,
+                            new_listings = new_listings + ?,
+                            last_release_id = ?
+                        WHERE cycle_id = ?
+                    """, (len(new_listings), release_id, cycle_id))
+                if claimed:
+                    self.conn.execute("""
+                        UPDATE scan_queue SET status = 'done', new_listings = ?, lease_until = NULL
+                        WHERE release_id = ?
+                    """, (len(new_listings), release_id))
+        
+        return new_listings
+
+    @timed
+    def record_prices(self, release_id: str, listings: List[Dict], rates: Dict[str, float],
+                      observed_at: float, complete: bool = None):
+        """Append price changes to price_history and refresh the release's stats."""
+        if not listings or not str(release_id).isdigit():
+            # An empty batch is as likely a failed fetch as a sold-out
+            # release; keep the last stats rather than wipe them.
+            return
+        
+        release = int(release_id)
+        observed_at = int(observed_at)
+        observations = observe(listings)
+        
+        with self.lock:
+            cursor = self.conn.cursor()
             cursor.execute("""
-                INSERT OR IGNORE INTO seen_listings 
-                (release_id, listing_id, price, condition, seller_username, listing_url)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (release_id, listing_id, price, condition, seller_username, listing_url))
+                SELECT listing_id, price_cents, currency, condition 
+                FROM listing_prices WHERE release_id = ?
+            """, (release,))
+            current = {row[0]: row[1:] for row in cursor.fetchall()}
             
-            conn.commit()
-            logger.debug(f"Marked listing {listing_id} for release {release_id} as seen")
+            changed = [obs for obs in observations if current.get(obs[0]) != obs[1:]]
+            gone = gone_listing_ids(current, [obs[0] for obs in observations], complete)
+            if gone:
+                # Off the market: stop tracking the price and start the
+                # retention clock on the seen mark.
+                cursor.executemany(
+                    "DELETE FROM listing_prices WHERE release_id = ? AND listing_id = ?",
+                    [(release, listing_id) for listing_id in gone]
+                )
+                cursor.executemany("""
+                    UPDATE seen_listings SET gone_at = ? 
+                    WHERE release_id = ? AND listing_id = ? AND gone_at IS NULL
+                """, [(observed_at, release, listing_id) for listing_id in gone])
+            relisted = [obs[0] for obs in changed if obs[0] not in current]
+            if relisted:
+                cursor.executemany("""
+                    UPDATE seen_listings SET gone_at = NULL 
+                    WHERE release_id = ? AND listing_id = ? AND gone_at IS NOT NULL
+                """, [(release, listing_id) for listing_id in relisted])
+            if changed:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO listing_prices 
+                    (release_id, listing_id, price_cents, currency, condition)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(release, *obs) for obs in changed])
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO price_history 
+                    (listing_id, observed_at, release_id, price_cents, currency, condition)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(obs[0], observed_at, release, *obs[1:]) for obs in changed])
+            
+            # Stats cover every listing still for sale, not just the
+            # fetched batch, which is often only the newest page.
+            for listing_id in gone:
+                del current[listing_id]
+            current.update((obs[0], obs[1:]) for obs in changed)
+            stats = price_stats(current, rates)
+            if stats:
+                cursor.execute("""
+                    INSERT INTO release_price_stats 
+                    (release_id, listings, min_cents, median_cents, last_cents, all_time_min_cents, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(release_id) DO UPDATE SET
+                        listings = excluded.listings,
+                        min_cents = excluded.min_cents,
+                        median_cents = excluded.median_cents,
+                        last_cents = excluded.last_cents,
+                        all_time_min_cents = MIN(all_time_min_cents, excluded.min_cents),
+                        updated_at = excluded.updated_at
+                    WHERE listings != excluded.listings
+                       OR min_cents IS NOT excluded.min_cents
+                       OR median_cents IS NOT excluded.median_cents
+                       OR last_cents IS NOT excluded.last_cents
+                """, (release, stats['listings'], stats['min_cents'], stats['median_cents'],
+                      stats['last_cents'], stats['min_cents'], observed_at))
+            self._commit()
+
+    def get_release_price_stats(self, release_id: str) -> Dict:
+        if not str(release_id).isdigit():
+            return None
+        
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT s.listings, s.min_cents, s.median_cents, s.last_cents, 
+                       s.all_time_min_cents, s.updated_at, w.artist, w.title
+                FROM release_price_stats s
+                LEFT JOIN wantlist_cache w ON w.release_id = CAST(s.release_id AS TEXT)
+                WHERE s.release_id = ?
+            """, (int(release_id),)).fetchone()
+            if not row:
+                return None
+            changes = self.conn.execute(
+                "SELECT COUNT(*) FROM price_history WHERE release_id = ?", (int(release_id),)
+            ).fetchone()[0]
+        
+        return {
+            'listings': row[0],
+            'min_cents': row[1],
+            'median_cents': row[2],
+            'last_cents': row[3],
+            'all_time_min_cents': row[4],
+            'updated_at': row[5],
+            'artist': row[6],
+            'title': row[7],
+            'price_changes': changes
+        }
+
+    def iter_price_history(self, batch_size: int = 10_000):
+        """Yield (release_id, listing_id, observed_at, price_cents, currency, condition) rows."""
+        last = (-1, -1)
+        while True:
+            with self.lock:
+                rows = self.conn.execute("""
+                    SELECT release_id, listing_id, observed_at, price_cents, currency, condition
+                    FROM price_history
+                    WHERE (listing_id, observed_at) > (?, ?)
+                    ORDER BY listing_id, observed_at
+                    LIMIT ?
+                """, (*last, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = (rows[-1][1], rows[-1][2])
+
+    def get_filter_rules(self, chat_id: int = None) -> List[Dict]:
+        query = """
+            SELECT chat_id, release_id, max_price, currency, min_condition, ships_from, min_seller_rating
+            FROM filter_rules
+        """
+        params = ()
+        if chat_id is not None:
+            query += " WHERE chat_id = ?"
+            params = (chat_id,)
+        
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY chat_id, release_id", params).fetchall()
+        return [
+            {
+                'chat_id': row[0],
+                'release_id': row[1],
+                'max_price': row[2],
+                'currency': row[3],
+                'min_condition': row[4],
+                'ships_from': row[5],
+                'min_seller_rating': row[6]
+            }
+            for row in rows
+        ]
+
+    def set_filter_rule(self, chat_id: int, release_id: str, rule: Dict):
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO filter_rules 
+                (chat_id, release_id, max_price, currency, min_condition, ships_from, min_seller_rating)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (chat_id, release_id or '', rule.get('max_price'), rule.get('currency'),
+                  rule.get('min_condition'), rule.get('ships_from'), rule.get('min_seller_rating')))
+            self._commit()
+
+    def delete_filter_rule(self, chat_id: int, release_id: str) -> bool:
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM filter_rules WHERE chat_id = ? AND release_id = ?",
+                (chat_id, release_id or '')
+            )
+            self._commit()
+            return cursor.rowcount > 0
+
+    def enqueue_scans(self, items: List[Dict], chat_ids: Dict[str, List[int]],
+                      cycle_id: int = None, now: float = None) -> int:
+        """Hand releases to the scan workers; ones already queued are left alone."""
+        now = now or time.time()
+        rows = [
+            (item['release_id'], cycle_id, json.dumps(item),
+             json.dumps(chat_ids.get(item['release_id']) or [0]), now)
+            for item in items
+        ]
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.executemany("""
+                INSERT OR IGNORE INTO scan_queue (release_id, cycle_id, item, chat_ids, enqueued_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            self._commit()
+            return cursor.rowcount
+
+    def claim_scans(self, worker: str, limit: int, lease_seconds: float, now: float = None) -> List[Dict]:
+        """Lease up to limit queued releases to worker, taking over expired leases."""
+        now = now or time.time()
+        with self.lock:
+            if self.conn.in_transaction:
+                self.conn.commit()
+            # IMMEDIATE takes the write lock before reading, so two workers
+            # can never select the same rows.
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute("""
+                    SELECT release_id, cycle_id, item, chat_ids FROM scan_queue
+                    WHERE status = 'queued' OR (status = 'claimed' AND lease_until < ?)
+                    ORDER BY enqueued_at
+                    LIMIT ?
+                """, (now, limit)).fetchall()
+                self.conn.executemany("""
+                    UPDATE scan_queue SET status = 'claimed', worker = ?, lease_until = ?
+                    WHERE release_id = ?
+                """, [(worker, now + lease_seconds, row[0]) for row in rows])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        
+        return [
+            {
+                'release_id': row[0],
+                'cycle_id': row[1],
+                'item': json.loads(row[2]),
+                'chat_ids': json.loads(row[3])
+            }
+            for row in rows
+        ]
+
+    def release_scans(self, release_ids: List[str] = None):
+        """Put claimed releases back in the queue; all of them when release_ids is None."""
+        with self.lock:
+            if release_ids is None:
+                self.conn.execute("""
+                    UPDATE scan_queue SET status = 'queued', worker = NULL, lease_until = NULL
+                    WHERE status = 'claimed'
+                """)
+            else:
+                self.conn.executemany("""
+                    UPDATE scan_queue SET status = 'queued', worker = NULL, lease_until = NULL
+                    WHERE release_id = ? AND status = 'claimed'
+                """, [(release_id,) for release_id in release_ids])
+            self._commit()
+
+    def cancel_scans(self, release_ids: List[str]) -> int:
+        """Drop unfinished scans from the queue, claimed or not."""
+        with self.lock:
+            cursor = self.conn.executemany(
+                "DELETE FROM scan_queue WHERE release_id = ? AND status != 'done'",
+                [(release_id,) for release_id in release_ids]
+            )
+            self._commit()
+            return cursor.rowcount
+
+    def fail_scan(self, release_id: str):
+        """Finish a claimed scan whose fetch or checkpoint failed, leaving the release unpolled."""
+        with self.lock:
+            self.conn.execute("""
+                UPDATE scan_queue SET status = 'done', new_listings = NULL, lease_until = NULL
+                WHERE release_id = ?
+            """, (release_id,))
+            self._commit()
+
+    def collect_finished_scans(self) -> List[tuple]:
+        """Remove and return (release_id, new_listings) for every finished scan.
+
+        new_listings is None for a scan whose fetch or checkpoint failed.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT release_id, new_listings FROM scan_queue WHERE status = 'done'"
+            ).fetchall()
+            if rows:
+                self.conn.executemany(
+                    "DELETE FROM scan_queue WHERE release_id = ? AND status = 'done'",
+                    [(row[0],) for row in rows]
+                )
+                self._commit()
+        return rows
+
+    def get_scan_queue_depth(self) -> int:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM scan_queue WHERE status != 'done'"
+            ).fetchone()[0]
+
+    def start_check_cycle(self, releases_total: int, now: float = None) -> int:
+        """Open a new full-check cycle, abandoning any that never finished."""
+        now = now or time.time()
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("UPDATE check_cycles SET status = 'abandoned' WHERE status = 'running'")
+            cursor.execute("""
+                INSERT INTO check_cycles (started_at, releases_total) VALUES (?, ?)
+            """, (now, releases_total))
+            cycle_id = cursor.lastrowid
+            self._commit()
+        return cycle_id
+
+    def get_unfinished_check_cycle(self) -> Dict:
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT cycle_id, started_at, releases_total, releases_done, last_release_id
+                FROM check_cycles WHERE status = 'running'
+                ORDER BY cycle_id DESC LIMIT 1
+            """).fetchone()
+        
+        if not row:
+            return None
+        return {
+            'cycle_id': row[0],
+            'started_at': row[1],
+            'releases_total': row[2],
+            'releases_done': row[3],
+            'last_release_id': row[4]
+        }
+
+    def finish_check_cycle(self, cycle_id: int, now: float = None, keep: int = 100):
+        now = now or time.time()
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                UPDATE check_cycles SET status = 'done', finished_at = ? WHERE cycle_id = ?
+            """, (now, cycle_id))
+            cursor.execute("DELETE FROM check_cycles WHERE cycle_id <= ?", (cycle_id - keep,))
+            self._commit()
+
+    def get_releases_polled_since(self, since: float) -> Set[str]:
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT release_id FROM wantlist_cache WHERE last_polled_at >= ?", (since,)
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    @timed
+    def get_pending_notifications(self, now: float, limit: int = 500) -> List[Dict]:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT id, chat_id, release_id, payload, attempts 
+                FROM notification_outbox 
+                WHERE status = 'pending' AND next_attempt_at <= ? AND chat_id != 0
+                ORDER BY id
+                LIMIT ?
+            """, (now, limit))
+            rows = cursor.fetchall()
+        
+        notifications = []
+        for row in rows:
+            payload = json.loads(row[3])
+            notifications.append({
+                'id': row[0],
+                'chat_id': row[1],
+                'release_id': row[2],
+                'item': payload['item'],
+                'listing': payload['listing'],
+                'attempts': row[4]
+            })
+        return notifications
+
+    @timed
+    def mark_notifications_sent(self, ids: List[int]):
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM notification_outbox WHERE id = ?",
+                [(notification_id,) for notification_id in ids]
+            )
+            self._commit()
+
+    @timed
+    def retry_notifications(self, ids: List[int], next_attempt_at: float, error: str):
+        with self.lock:
+            self.conn.executemany("""
+                UPDATE notification_outbox 
+                SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            """, [(next_attempt_at, error, notification_id) for notification_id in ids])
+            self._commit()
+
+    @timed
+    def fail_notifications(self, ids: List[int], error: str):
+        with self.lock:
+            self.conn.executemany("""
+                UPDATE notification_outbox 
+                SET status = 'failed', attempts = attempts + 1, last_error = ?
+                WHERE id = ?
+            """, [(error, notification_id) for notification_id in ids])
+            self._commit()
+
+    @timed
+    def get_pending_notifications_count(self) -> int:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM notification_outbox WHERE status = 'pending'")
+            return cursor.fetchone()[0]
+
+    def _index(self, release_id: str, listing_id: str):
+        key = pack_key(release_id, listing_id)
+        if key is None:
+            return
+        if self.batch_depth:
+            # A rolled-back batch must not leave its listings marked seen.
+            self.batch_keys.append(key)
+        else:
+            self._add_to_index(key)
+
+    def _add_to_index(self, key: int):
+        if not self.seen_index.loaded:
+            self.seen_index_backlog.append(key)
+            return
+        self.seen_index.add(key)
+        if self.seen_index.merge_due:
+            work = self.seen_index.start_merge()
+            threading.Thread(
+                target=self._merge_seen_index, args=(self.seen_index, work),
+                name='seen-index-merge', daemon=True
+            ).start()
+
+    def _merge_seen_index(self, index: SeenIndex, work: tuple):
+        # Rebuilding a multi-million key array takes a while; only the
+        # swap needs the lock, so writers and handlers are not stalled.
+        try:
+            result = SeenIndex.build_merge(*work)
         except Exception as e:
-            logger.error(f"Error marking listing as seen: {e}")
-        finally:
-            conn.close()
+            logger.error(f"Error merging seen index: {e}")
+            result = None
+        with self.lock:
+            if result is None:
+                # Put the frozen keys back so the next merge picks them up.
+                index.recent.update(index.merging)
+                index.merging = set()
+            else:
+                index.finish_merge(*result)
 
     def get_seen_listings_count(self) -> int:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Maintained by triggers on seen_listings; see migrations.maintained_counts.
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT count FROM table_counts WHERE name = 'seen_listings'"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def cache_wantlist_item(self, release_id: str, artist: str, title: str, release_url: str):
+        with self.lock:
+            try:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO wantlist_cache 
+                    (release_id, artist, title, release_url, last_checked)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, (release_id, artist, title, release_url))
+                
+                self._commit()
+            except Exception as e:
+                logger.error(f"Error caching wantlist item: {e}")
+
+    def get_user_release_ids(self, username: str) -> Set[str]:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT release_id FROM user_wants WHERE username = ?", (username,))
+            return {row[0] for row in cursor.fetchall()}
+
+    @timed
+    def get_cached_wantlist(self, usernames: List[str] = None) -> List[Dict]:
+        """Cached releases, limited to those wanted by any of usernames when given."""
+        query = """
+            SELECT release_id, artist, title, year, release_url 
+            FROM wantlist_cache 
+        """
+        params = ()
+        if usernames is not None:
+            placeholders = ",".join("?" * len(usernames))
+            query += f"""
+            WHERE release_id IN (
+                SELECT release_id FROM user_wants WHERE username IN ({placeholders})
+            )
+            """
+            params = tuple(usernames)
+        query += "ORDER BY date_added DESC"
         
-        cursor.execute("SELECT COUNT(*) FROM seen_listings")
-        count = cursor.fetchone()[0]
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         
-        conn.close()
-        return count
+        return [
+            {
+                'release_id': row[0],
+                'artist': row[1],
+                'title': row[2],
+                'year': row[3] or 'N/A',
+                'url': row[4]
+            }
+            for row in rows
+        ]
 
-    def cache_wantlist_item(self, release_id: str, artist: str, title: str, release_url: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @timed
+    def upsert_wantlist_items(self, items: List[Dict]) -> int:
+        """Insert new release metadata and update changed rows; returns rows written."""
+        if not items:
+            return 0
         
-        try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO wantlist_cache 
-                (release_id, artist, title, release_url, last_checked)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (release_id, artist, title, release_url))
+        # Metadata the want did not carry (None) keeps whatever the
+        # enricher stored.
+        rows = [
+            (item['release_id'], item['artist'], item['title'], str(item.get('year', 'N/A')),
+             item['url'], item.get('date_added'),
+             item.get('genres'), item.get('label'), item.get('thumb_url'))
+            for item in items
+        ]
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany("""
+                INSERT INTO wantlist_cache 
+                (release_id, artist, title, year, release_url, date_added,
+                 genres, label, thumb_url, last_checked)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(release_id) DO UPDATE SET 
+                    artist = excluded.artist,
+                    title = excluded.title,
+                    year = excluded.year,
+                    release_url = excluded.release_url,
+                    date_added = COALESCE(date_added, excluded.date_added),
+                    genres = COALESCE(excluded.genres, genres),
+                    label = COALESCE(excluded.label, label),
+                    thumb_url = COALESCE(excluded.thumb_url, thumb_url),
+                    last_checked = CURRENT_TIMESTAMP
+                WHERE artist IS NOT excluded.artist
+                   OR title IS NOT excluded.title
+                   OR year IS NOT excluded.year
+                   OR release_url IS NOT excluded.release_url
+                   OR date_added IS NULL
+                   OR COALESCE(excluded.genres, genres) IS NOT genres
+                   OR COALESCE(excluded.label, label) IS NOT label
+                   OR COALESCE(excluded.thumb_url, thumb_url) IS NOT thumb_url
+            """, rows)
             
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Error caching wantlist item: {e}")
-        finally:
-            conn.close()
+            self._commit()
+            return self.conn.total_changes - before
 
-    def get_cached_wantlist_item(self, release_id: str) -> Dict:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def add_user_wants(self, username: str, items: List[Dict]) -> int:
+        if not items:
+            return 0
         
-        cursor.execute("""
-            SELECT artist, title, release_url 
-            FROM wantlist_cache 
-            WHERE release_id = ?
-        """, (release_id,))
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO user_wants (username, release_id, date_added)
+                VALUES (?, ?, ?)
+            """, [(username, item['release_id'], item.get('date_added')) for item in items])
+            self._commit()
+            return self.conn.total_changes - before
+
+    def remove_user_wants(self, username: str, release_ids: List[str]) -> int:
+        if not release_ids:
+            return 0
+        
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "DELETE FROM user_wants WHERE username = ? AND release_id = ?",
+                [(username, release_id) for release_id in release_ids]
+            )
+            self._commit()
+            return self.conn.total_changes - before
+
+    def prune_wantlist_cache(self) -> int:
+        """Drop cached releases that no user wants any more."""
+        with self.lock:
+            cursor = self.conn.execute("""
+                DELETE FROM wantlist_cache 
+                WHERE release_id NOT IN (SELECT release_id FROM user_wants)
+            """)
+            self._commit()
+            return cursor.rowcount
+
+    def get_releases_to_enrich(self, limit: int, retry_before: float) -> List[str]:
+        """Releases with no metadata yet, newest wants first; failed ones wait for retry_before."""
+        with self.lock:
+            cursor = self.conn.execute("""
+                SELECT release_id FROM wantlist_cache 
+                WHERE genres IS NULL AND (enriched_at IS NULL OR enriched_at < ?)
+                ORDER BY date_added DESC
+                LIMIT ?
+            """, (retry_before, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed
+    def update_release_metadata(self, release_id: str, metadata: Optional[Dict]):
+        """Store fetched metadata, or with None just note the attempt."""
+        with self.lock:
+            if metadata is None:
+                self.conn.execute(
+                    "UPDATE wantlist_cache SET enriched_at = ? WHERE release_id = ?",
+                    (time.time(), release_id)
+                )
+            else:
+                self.conn.execute("""
+                    UPDATE wantlist_cache 
+                    SET year = ?, genres = ?, label = ?, thumb_url = ?, enriched_at = ?
+                    WHERE release_id = ?
+                """, (str(metadata['year']), metadata['genres'] or '', metadata['label'] or '',
+                      metadata['thumb_url'] or '', time.time(), release_id))
+            self._commit()
+
+    @timed
+    def get_release_metadata(self, release_ids: List[str]) -> Dict[str, Dict]:
+        """Known year, genres, label and thumbnail per release; unknown fields are left out."""
+        if not release_ids:
+            return {}
+        placeholders = ",".join("?" * len(release_ids))
+        with self.lock:
+            cursor = self.conn.execute(f"""
+                SELECT release_id, year, genres, label, thumb_url 
+                FROM wantlist_cache 
+                WHERE release_id IN ({placeholders})
+            """, tuple(release_ids))
+            rows = cursor.fetchall()
+        
+        metadata = {}
+        for release_id, *values in rows:
+            fields = dict(zip(('year', 'genres', 'label', 'thumb_url'), values))
+            metadata[release_id] = {
+                name: value for name, value in fields.items()
+                if value and value not in ('N/A', '0')
+            }
+        return metadata
+
+    @timed
+    def search_wantlist(self, username: str, query: str, limit: int = 10) -> List[Dict]:
+        """Releases in username's wantlist whose artist, title, label, genres or year contain every word of query."""
+        terms = query.split()
+        if not terms:
+            return []
         
-        result = cursor.fetchone()
-        conn.close()
+        haystack = " || ' ' || ".join(
+            f"COALESCE(w.{column}, '')" for column in ('artist', 'title', 'label', 'genres', 'year')
+        )
+        conditions = " AND ".join(f"{haystack} LIKE ? ESCAPE '\\'" for _ in terms)
+        patterns = [
+            "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            for term in terms
+        ]
+        with self.lock:
+            cursor = self.conn.execute(f"""
+                SELECT w.release_id, w.artist, w.title, w.year, w.label, w.genres 
+                FROM wantlist_cache w
+                JOIN user_wants u ON u.release_id = w.release_id
+                WHERE u.username = ? AND {conditions}
+                ORDER BY u.date_added DESC
+                LIMIT ?
+            """, (username, *patterns, limit))
+            rows = cursor.fetchall()
+        
+        return [
+            {
+                'release_id': row[0],
+                'artist': row[1],
+                'title': row[2],
+                'year': row[3] or 'N/A',
+                'label': row[4],
+                'genres': row[5]
+            }
+            for row in rows
+        ]
+
+    @timed
+    def get_release_subscriptions(self) -> Dict[str, List[int]]:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT w.release_id, s.chat_id 
+                FROM user_wants w 
+                JOIN subscribers s ON s.discogs_username = w.username 
+                WHERE s.active = 1
+            """)
+            rows = cursor.fetchall()
+        
+        subscriptions = {}
+        for release_id, chat_id in rows:
+            subscriptions.setdefault(release_id, []).append(chat_id)
+        return subscriptions
+
+    def add_subscriber(self, chat_id: int, username: str = None):
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO subscribers (chat_id, discogs_username) VALUES (?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET 
+                    active = 1,
+                    discogs_username = COALESCE(excluded.discogs_username, discogs_username)
+            """, (chat_id, username))
+            self._commit()
+
+    def set_subscriber_username(self, chat_id: int, username: str, owner_username: str = None) -> bool:
+        """Link chat_id to a Discogs username; False if that would move the owner's wantlist.
+
+        The owner's wantlist is read with the owner's token, private or not,
+        so it follows the claim_owner rule: only the chat that holds it may
+        name it, and that chat cannot drop it for another username (which
+        would free it for the next stranger to /start).
+        """
+        with self.lock:
+            if owner_username:
+                cursor = self.conn.cursor()
+                cursor.execute("""
+                    SELECT chat_id FROM subscribers WHERE discogs_username = ? COLLATE NOCASE
+                """, (owner_username,))
+                holders = {row[0] for row in cursor.fetchall()}
+                if username.lower() == owner_username.lower():
+                    if holders - {chat_id}:
+                        return False
+                    username = owner_username
+                elif chat_id in holders:
+                    return False
+            self.add_subscriber(chat_id, username)
+            return True
+
+    def deactivate_subscriber(self, chat_id: int):
+        with self.lock:
+            self.conn.execute("UPDATE subscribers SET active = 0 WHERE chat_id = ?", (chat_id,))
+            self.conn.execute(
+                "DELETE FROM notification_outbox WHERE chat_id = ? AND status = 'pending'",
+                (chat_id,)
+            )
+            self._commit()
+
+    def get_subscriber(self, chat_id: int) -> Dict:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT chat_id, discogs_username, active FROM subscribers WHERE chat_id = ?
+            """, (chat_id,))
+            result = cursor.fetchone()
+        
+        if result:
+            return {'chat_id': result[0], 'username': result[1], 'active': bool(result[2])}
+        return None
+
+    def get_active_usernames(self) -> List[str]:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT discogs_username FROM subscribers 
+                WHERE active = 1 AND discogs_username IS NOT NULL
+            """)
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_subscriber_count(self) -> int:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM subscribers WHERE active = 1")
+            return cursor.fetchone()[0]
+
+    def claim_owner(self, chat_id: int, owner_username: str) -> bool:
+        """Give chat_id the owner's wantlist if no other chat has ever had it.
+
+        A chat that has it and sent /stop still counts, so the next stranger
+        to send /start cannot take over the owner's wantlist. Notifications
+        queued while nobody owned it (chat 0) move to this chat.
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT 1 FROM subscribers 
+                WHERE discogs_username = ? COLLATE NOCASE AND chat_id != ?
+            """, (owner_username, chat_id))
+            if cursor.fetchone():
+                return False
+            
+            cursor.execute("""
+                UPDATE subscribers SET discogs_username = ? 
+                WHERE chat_id = ? AND (discogs_username IS NULL OR discogs_username = ?)
+            """, (owner_username, chat_id, owner_username))
+            if cursor.rowcount == 0:
+                return False
+            
+            cursor.execute("""
+                INSERT OR IGNORE INTO notification_outbox 
+                (chat_id, release_id, listing_id, payload, attempts, next_attempt_at)
+                SELECT ?, release_id, listing_id, payload, attempts, next_attempt_at 
+                FROM notification_outbox WHERE chat_id = 0
+            """, (chat_id,))
+            cursor.execute("DELETE FROM notification_outbox WHERE chat_id = 0")
+            self._commit()
+            return True
+
+    def bootstrap_owner(self, owner_username: str, chat_ids: List[int]):
+        """Carry single-user installs over: the existing wantlist and users.txt chats belong to the owner."""
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT 1 FROM user_wants LIMIT 1")
+            if cursor.fetchone() is None:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO user_wants (username, release_id, date_added)
+                    SELECT ?, release_id, date_added FROM wantlist_cache
+                """, (owner_username,))
+            
+            cursor.execute("SELECT 1 FROM subscribers LIMIT 1")
+            if cursor.fetchone() is None:
+                cursor.executemany("""
+                    INSERT OR IGNORE INTO subscribers (chat_id, discogs_username) VALUES (?, ?)
+                """, [(chat_id, owner_username) for chat_id in chat_ids])
+            
+            self._commit()
+
+    def set_favorite(self, release_id: str, favorite: bool) -> bool:
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE wantlist_cache SET favorite = ? WHERE release_id = ?",
+                (int(favorite), release_id)
+            )
+            self._commit()
+            return cursor.rowcount > 0
+
+    @timed
+    def get_release_poll_stats(self, hot_window_days: int = HOT_WINDOW_DAYS) -> List[Dict]:
+        # Read from the counts triggers keep per release (see
+        # migrations.release_activity_counts), never from seen_listings;
+        # the hot window is counted in whole UTC days.
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT w.release_id, w.favorite, w.date_added, a.last_new_at, d.recent_new, w.last_polled_at
+                FROM wantlist_cache w
+                LEFT JOIN release_activity a ON a.release_id = w.release_id
+                LEFT JOIN (
+                    SELECT release_id, SUM(count) AS recent_new
+                    FROM release_new_daily
+                    WHERE day >= ?
+                    GROUP BY release_id
+                ) d ON d.release_id = w.release_id
+            """, ((int(time.time()) - hot_window_days * 86400) // 86400,))
+            rows = cursor.fetchall()
+        
+        return [
+            {
+                'release_id': row[0],
+                'favorite': bool(row[1]),
+                'date_added': row[2],
+                'last_new_at': row[3],
+                'recent_new': row[4] or 0,
+                'last_polled_at': row[5]
+            }
+            for row in rows
+        ]
+
+    def get_cached_wantlist_item(self, release_id: str) -> Dict:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT artist, title, release_url 
+                FROM wantlist_cache 
+                WHERE release_id = ?
+            """, (release_id,))
+            
+            result = cursor.fetchone()
         
         if result:
             return {
@@ -124,3 +1443,65 @@ class Database:
                 'release_url': result[2]
             }
         return None
+
+    @timed
+    def get_http_cache_entry(self, cache_key: str) -> Dict:
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT etag, last_modified, body, fetched_at 
+                FROM http_cache 
+                WHERE cache_key = ?
+            """, (cache_key,))
+            
+            result = cursor.fetchone()
+        
+        if result:
+            return {
+                'etag': result[0],
+                'last_modified': result[1],
+                'body': result[2],
+                'fetched_at': result[3]
+            }
+        return None
+
+    @timed
+    def put_http_cache_entry(self, cache_key: str, etag: str, last_modified: str,
+                             body: str, fetched_at: float):
+        with self.lock:
+            try:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO http_cache 
+                    (cache_key, etag, last_modified, body, fetched_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (cache_key, etag, last_modified, body, fetched_at, fetched_at))
+                
+                self._commit()
+            except Exception as e:
+                logger.error(f"Error caching HTTP response: {e}")
+
+    def touch_http_cache_entry(self, cache_key: str, used_at: float, revalidated: bool = False):
+        with self.lock:
+            if revalidated:
+                self.conn.execute("""
+                    UPDATE http_cache SET last_used = ?, fetched_at = ? WHERE cache_key = ?
+                """, (used_at, used_at, cache_key))
+            else:
+                self.conn.execute("""
+                    UPDATE http_cache SET last_used = ? WHERE cache_key = ?
+                """, (used_at, cache_key))
+            
+            self._commit()
+
+    def evict_http_cache(self, max_entries: int) -> int:
+        with self.lock:
+            cursor = self.conn.execute("""
+                DELETE FROM http_cache WHERE cache_key IN (
+                    SELECT cache_key FROM http_cache 
+                    ORDER BY last_used DESC 
+                    LIMIT -1 OFFSET ?
+                )
+            """, (max_entries,))
+            
+            self._commit()
+            return cursor.rowcount
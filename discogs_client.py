@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time
+import httpx
+import metrics
+from typing import Awaitable, Callable, Dict, List, Tuple
+from http_cache import ResponseCache
+from rate_limiter import RateLimiter
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://api.discogs.com"
+USER_AGENT = "JPDiscogsBot/1.0"
+MAX_RETRIES = 3
+MARKETPLACE_PAGE_SIZE = 100
+
+
+class DiscogsClient:
+    """Async Discogs API client.
+
+    One instance is shared by the whole process so every call reuses the same
+    keep-alive connection pool (and a single HTTP/2 connection when h2 is
+    installed) instead of paying a TCP+TLS handshake per request.
+    """
+
+    def __init__(self, token: str, username: str, limiter: RateLimiter = None,
+                 max_connections: int = 10, cache: ResponseCache = None,
+                 base_url: str = BASE_URL):
+        self.username = username
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "User-Agent": USER_AGENT,
+                "Authorization": f"Discogs token={token}",
+            },
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=120,
+            ),
+            timeout=15,
+        )
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def _get(self, path: str, params: Dict = None) -> Dict:
+        # Marketplace and other uncached endpoints skip the thread hop into
+        # SQLite entirely; that is most of the traffic in a check cycle.
+        cache = self.cache if self.cache and self.cache.ttl_for(path) is not None else None
+        entry = None
+        if cache:
+            entry = await asyncio.to_thread(cache.lookup, path, params)
+            if entry and entry['fresh']:
+                return cache.decode(entry)
+        
+        headers = cache.conditional_headers(entry) if cache else {}
+        endpoint = metrics.endpoint_label(path)
+        
+        for attempt in range(MAX_RETRIES):
+            # Fresh cache hits above never reach the limiter; Discogs still
+            # counts conditional requests, so revalidations take a token.
+            await self.limiter.acquire()
+            start = time.perf_counter()
+            resp = await self.http.get(path, params=params, headers=headers)
+            metrics.DISCOGS_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+            self.limiter.update_from_headers(resp.headers)
+            
+            if resp.status_code == 429:
+                metrics.RATE_LIMITED.labels('discogs').inc()
+                metrics.RETRIES.labels('discogs').inc()
+                self.limiter.backoff(float(resp.headers.get('Retry-After', 60)))
+                continue
+            
+            if resp.status_code == 304 and entry:
+                await asyncio.to_thread(cache.mark_revalidated, entry)
+                return cache.decode(entry)
+            
+            resp.raise_for_status()
+            if cache:
+                await asyncio.to_thread(cache.store, path, params, resp.headers, resp.text)
+            return resp.json()
+        
+        raise RuntimeError(f"Discogs rate limit exceeded for {path} after {MAX_RETRIES} attempts")
+
+    async def search(self, query: str, qtype: str = "release", page: int = 1,
+                     per_page: int = 10) -> List[Dict]:
+        data = await self._get("/database/search", {
+            "q": query,
+            "type": qtype,
+            "page": page,
+            "per_page": per_page,
+        })
+        return data.get("results", [])
+
+    async def get_release(self, release_id) -> Dict:
+        return await self._get(f"/releases/{release_id}")
+
+    async def iter_wantlist_pages(self, username: str = None, per_page: int = 100):
+        """Yield wantlist pages, most recently added first."""
+        username = username or self.username
+        page = 1
+        
+        while True:
+            data = await self._get(f"/users/{username}/wants", {
+                "page": page,
+                "per_page": per_page,
+                "sort": "added",
+                "sort_order": "desc",
+            })
+            
+            yield [parse_want(want) for want in data.get("wants", [])]
+            
+            if page >= data.get("pagination", {}).get("pages", 1):
+                break
+            page += 1
+
+    async def get_wantlist(self, username: str = None) -> List[Dict]:
+        items = []
+        async for page in self.iter_wantlist_pages(username):
+            items.extend(page)
+        return items
+
+    async def iter_marketplace_pages(self, release_id: str, per_page: int = MARKETPLACE_PAGE_SIZE):
+        """Yield (listings, is_last_page) for a release, newest listing first."""
+        page = 1
+        
+        while True:
+            data = await self._get("/marketplace/search", {
+                "release_id": release_id,
+                "sort": "listed",
+                "sort_order": "desc",
+                "page": page,
+                "per_page": per_page,
+            })
+            
+            listings = [parse_listing(listing) for listing in data.get("listings", [])]
+            last = page >= data.get("pagination", {}).get("pages", 1) or len(listings) < per_page
+            yield listings, last
+            
+            if last:
+                break
+            page += 1
+
+    async def get_new_marketplace_listings(self, release_id: str,
+                                           reached_seen: Callable[[List[str]], Awaitable[bool]],
+                                           max_pages: int = 10) -> Tuple[List[Dict], bool]:
+        """Page through a release's listings until reaching ones already seen.
+
+        reached_seen gets each page's listing ids and says whether paging
+        can stop there. In steady state the first page already holds a seen
+        listing, so this is one request; a burst of more than a page of new
+        listings costs one more request per page, up to max_pages.
+
+        Returns every listing fetched, newest first, and whether that is the
+        release's whole marketplace.
+        """
+        listings = []
+        pages = 0
+        async for page, last in self.iter_marketplace_pages(release_id):
+            listings.extend(page)
+            pages += 1
+            if last:
+                return listings, True
+            if pages >= max_pages or await reached_seen([listing['listing_id'] for listing in page]):
+                return listings, False
+        return listings, True
+
+
+def parse_want(want: Dict) -> Dict:
+    info = want.get("basic_information", {})
+    release_id = str(want["id"])
+    return {
+        'release_id': release_id,
+        'artist': ", ".join(a["name"] for a in info.get("artists", [])),
+        'title': info.get("title", "Unknown"),
+        'year': info.get("year") or 'N/A',
+        'url': f"https://www.discogs.com/release/{release_id}",
+        'date_added': want.get("date_added"),
+        **parse_release_metadata(info),
+    }
+
+
+def parse_release_metadata(data: Dict) -> Dict:
+    """Genres, first label and thumbnail of a release or a want's basic_information.
+
+    A field missing from data comes back as None (not known yet), which is
+    different from an empty string (Discogs has none).
+    """
+    label = None
+    if "labels" in data:
+        label = data["labels"][0].get("name", '') if data["labels"] else ''
+    return {
+        'genres': ", ".join(data["genres"]) if "genres" in data else None,
+        'label': label,
+        'thumb_url': data.get("thumb") if "thumb" in data else None,
+    }
+
+
+def parse_listing(data: Dict) -> Dict:
+    price = data.get("price", {})
+    seller = data.get("seller", {})
+    return {
+        'listing_id': str(data["id"]),
+        'price': f"{price.get('value', '?')} {price.get('currency', '')}".strip(),
+        'price_value': price.get('value'),
+        'currency': price.get('currency'),
+        'condition': data.get("condition", "N/A"),
+        'sleeve_condition': data.get("sleeve_condition", "N/A"),
+        'seller_username': seller.get("username", "N/A"),
+        'seller_rating': seller.get("stats", {}).get("rating", "N/A"),
+        'ships_from': data.get("ships_from", "N/A"),
+        'comments': data.get("comments", ""),
+        'url': data.get("uri", f"https://www.discogs.com/sell/item/{data['id']}"),
+    }
+
+
+def format_release_info(data: Dict) -> str:
+    title = data.get("title", "Unknown")
+    artists = ", ".join(a["name"] for a in data.get("artists", []))
+    year = data.get("year", "N/A")
+    genres = ", ".join(data.get("genres", []))
+    return f"🎵 {title}\n👤 {artists}\n📀 {year} • {genres}"
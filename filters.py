@@ -0,0 +1,229 @@
+"""Per-chat listing filters, applied before anything reaches the outbox.
+
+A rule belongs to a chat and either one release or, with an empty
+release_id, every release the chat wants. A release rule replaces the
+chat's global rule rather than adding to it. Each rule is compiled once
+into a predicate; ListingFilter.apply runs it over a fetched batch.
+"""
+import logging
+import re
+from typing import Callable, Dict, List, Optional
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worst to best, as Discogs spells them.
+CONDITION_GRADES = [
+    'Poor (P)',
+    'Fair (F)',
+    'Good (G)',
+    'Good Plus (G+)',
+    'Very Good (VG)',
+    'Very Good Plus (VG+)',
+    'Near Mint (NM or M-)',
+    'Mint (M)',
+]
+# Short codes by rank; rules store these whichever spelling was typed.
+CONDITION_CODES = ['P', 'F', 'G', 'G+', 'VG', 'VG+', 'NM', 'M']
+CONDITION_RANKS = {grade: rank for rank, grade in enumerate(CONDITION_GRADES)}
+CONDITION_RANKS.update({grade.upper(): rank for rank, grade in enumerate(CONDITION_GRADES)})
+CONDITION_RANKS.update({code: rank for rank, code in enumerate(CONDITION_CODES)})
+CONDITION_RANKS['M-'] = 6
+
+# Approximate USD value of one unit of each currency Discogs sells in.
+# Good enough to compare against a price cap; override with CURRENCY_RATES.
+DEFAULT_USD_RATES = {
+    'USD': 1.0,
+    'EUR': 1.08,
+    'GBP': 1.27,
+    'CAD': 0.73,
+    'AUD': 0.66,
+    'JPY': 0.0067,
+    'CHF': 1.13,
+    'MXN': 0.058,
+    'BRL': 0.18,
+    'NZD': 0.61,
+    'SEK': 0.095,
+    'ZAR': 0.054,
+}
+
+_PRICE = re.compile(r'^\s*([\d.,]+)\s*([A-Za-z]{3})?\s*$')
+_OPTION = re.compile(r'(\w+)=(.*?)(?=\s+\w+=|$)')
+
+
+def parse_rates(text: str) -> Dict[str, float]:
+    """Parse 'EUR=1.08,GBP=1.27' into USD rates layered over the defaults."""
+    rates = dict(DEFAULT_USD_RATES)
+    for part in (text or '').split(','):
+        if '=' in part:
+            code, value = part.split('=', 1)
+            try:
+                rates[code.strip().upper()] = float(value)
+            except ValueError:
+                logger.warning(f"Ignoring bad currency rate: {part}")
+    return rates
+
+
+def condition_rank(value) -> Optional[int]:
+    if not value:
+        return None
+    rank = CONDITION_RANKS.get(value)
+    if rank is None:
+        rank = CONDITION_RANKS.get(str(value).strip().upper())
+    return rank
+
+
+def parse_price(text) -> tuple:
+    """Split '25 EUR' / '25EUR' / '25' into (25.0, 'EUR' or None)."""
+    match = _PRICE.match(str(text or ''))
+    if not match:
+        return None, None
+    try:
+        value = float(match.group(1).replace(',', ''))
+    except ValueError:
+        return None, None
+    currency = match.group(2).upper() if match.group(2) else None
+    return value, currency
+
+
+def parse_rule_args(args: List[str]) -> tuple:
+    """Parse /filter arguments into (release_id, rule); rule is None for 'clear'.
+
+    /filter [release id] price=30EUR condition=VG+ ships=Germany,France rating=99
+    """
+    release_id = ''
+    if args and args[0].isdigit():
+        release_id, args = args[0], args[1:]
+    if args == ['clear']:
+        return release_id, None
+    
+    rule = {}
+    for key, value in _OPTION.findall(' '.join(args)):
+        key, value = key.lower(), value.strip()
+        if key == 'price':
+            price, currency = parse_price(value)
+            if price is None:
+                raise ValueError(f"Bad price: {value}")
+            rule['max_price'] = price
+            rule['currency'] = currency or 'USD'
+        elif key == 'condition':
+            rank = condition_rank(value)
+            if rank is None:
+                raise ValueError(f"Unknown condition: {value} (use M, NM, VG+, VG, G+, G, F, P)")
+            rule['min_condition'] = CONDITION_CODES[rank]
+        elif key == 'ships':
+            rule['ships_from'] = value
+        elif key == 'rating':
+            rating = _rating(value.rstrip('%'))
+            if rating is None:
+                raise ValueError(f"Bad seller rating: {value}")
+            rule['min_seller_rating'] = rating
+        else:
+            raise ValueError(f"Unknown filter option: {key}")
+    
+    if not rule:
+        raise ValueError("No filter options given")
+    return release_id, rule
+
+
+def _rating(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compile_rule(rule: Dict, rates: Dict[str, float]) -> Callable[[Dict], bool]:
+    """Build a predicate for one rule; checks that are not set cost nothing."""
+    checks = []
+    
+    if rule.get('max_price') is not None:
+        cap_rate = rates.get(rule.get('currency') or 'USD')
+        if cap_rate is None:
+            logger.warning(f"Unknown currency {rule.get('currency')}, ignoring price cap")
+        else:
+            cap_usd = rule['max_price'] * cap_rate
+
+            def price_ok(listing):
+                value = listing.get('price_value')
+                rate = rates.get(listing.get('currency'))
+                # Keep listings we cannot price rather than hide them.
+                return value is None or rate is None or value * rate <= cap_usd
+            checks.append(price_ok)
+    
+    min_rank = condition_rank(rule.get('min_condition'))
+    if min_rank is not None:
+        def condition_ok(listing):
+            rank = condition_rank(listing.get('condition'))
+            return rank is None or rank >= min_rank
+        checks.append(condition_ok)
+    
+    if rule.get('ships_from'):
+        countries = {c.strip().lower() for c in rule['ships_from'].split(',') if c.strip()}
+
+        def location_ok(listing):
+            return str(listing.get('ships_from', '')).lower() in countries
+        checks.append(location_ok)
+    
+    if rule.get('min_seller_rating') is not None:
+        min_rating = rule['min_seller_rating']
+
+        def rating_ok(listing):
+            rating = _rating(listing.get('seller_rating'))
+            return rating is None or rating >= min_rating
+        checks.append(rating_ok)
+    
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda listing: all(check(listing) for check in checks)
+
+
+def describe_rule(rule: Dict) -> str:
+    parts = []
+    if rule.get('max_price') is not None:
+        parts.append(f"price ≤ {rule['max_price']:g} {rule.get('currency') or 'USD'}")
+    if rule.get('min_condition'):
+        parts.append(f"condition ≥ {rule['min_condition']}")
+    if rule.get('ships_from'):
+        parts.append(f"ships from {rule['ships_from']}")
+    if rule.get('min_seller_rating') is not None:
+        parts.append(f"seller ≥ {rule['min_seller_rating']:g}%")
+    return ", ".join(parts) or "no limits"
+
+
+class ListingFilter:
+    def __init__(self, rates: Dict[str, float] = None):
+        self.rates = rates or dict(DEFAULT_USD_RATES)
+        self.predicates = {}
+
+    def load(self, rules: List[Dict]):
+        predicates = {}
+        for rule in rules:
+            predicate = compile_rule(rule, self.rates)
+            # Stored even when None so an empty release rule still
+            # overrides the chat's global one.
+            predicates[(rule['chat_id'], rule['release_id'])] = predicate
+        self.predicates = predicates
+        logger.info(f"Loaded {len(rules)} filter rule(s)")
+
+    def predicate_for(self, chat_id: int, release_id: str) -> Optional[Callable[[Dict], bool]]:
+        key = (chat_id, release_id)
+        if key in self.predicates:
+            return self.predicates[key]
+        return self.predicates.get((chat_id, ''))
+
+    def apply(self, chat_ids: List[int], release_id: str, listings: List[Dict]) -> Dict[int, List[Dict]]:
+        """Map each chat to the listings its rules let through."""
+        matched = {}
+        for chat_id in chat_ids:
+            predicate = self.predicate_for(chat_id, release_id) if self.predicates else None
+            if predicate is None:
+                matched[chat_id] = listings
+                continue
+            kept = [listing for listing in listings if predicate(listing)]
+            if len(kept) < len(listings):
+                metrics.LISTINGS_FILTERED.inc(len(listings) - len(kept))
+            matched[chat_id] = kept
+        return matched
@@ -0,0 +1,111 @@
+import json
+import time
+import logging
+import metrics
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+# Seconds a stored response is served without asking Discogs. Endpoints
+# with a TTL of 0 are always revalidated with If-None-Match /
+# If-Modified-Since; endpoints not listed here are never cached.
+DEFAULT_TTLS = {
+    '/releases/': 7 * 24 * 3600,
+    '/database/search': 24 * 3600,
+    '/users/': 0,
+}
+
+EVICT_EVERY = 100
+
+
+class ResponseCache:
+    """SQLite-backed HTTP cache for Discogs GET responses, with LRU eviction."""
+
+    def __init__(self, db, max_entries: int = 10_000, ttls: Dict[str, int] = None):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stores = 0
+
+    def ttl_for(self, path: str) -> Optional[int]:
+        for prefix, ttl in self.ttls.items():
+            if path.startswith(prefix):
+                return ttl
+        return None
+
+    @staticmethod
+    def make_key(path: str, params: Dict = None) -> str:
+        if not params:
+            return path
+        return f"{path}?{urlencode(sorted(params.items()))}"
+
+    def lookup(self, path: str, params: Dict = None) -> Optional[Dict]:
+        """Return the stored entry, with 'fresh' set when it is within its TTL."""
+        ttl = self.ttl_for(path)
+        if ttl is None:
+            return None
+        
+        key = self.make_key(path, params)
+        entry = self.db.get_http_cache_entry(key)
+        if entry is None:
+            return None
+        
+        now = time.time()
+        entry['key'] = key
+        entry['fresh'] = now - entry['fetched_at'] < ttl
+        if entry['fresh']:
+            self.hits += 1
+            metrics.HTTP_CACHE_LOOKUPS.labels('hit').inc()
+            self.db.touch_http_cache_entry(key, now)
+        return entry
+
+    def conditional_headers(self, entry: Optional[Dict]) -> Dict:
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def mark_revalidated(self, entry: Dict):
+        self.revalidated += 1
+        metrics.HTTP_CACHE_LOOKUPS.labels('revalidated').inc()
+        self.db.touch_http_cache_entry(entry['key'], time.time(), revalidated=True)
+
+    def store(self, path: str, params: Dict, headers, body: str):
+        if self.ttl_for(path) is None:
+            return
+        
+        self.misses += 1
+        metrics.HTTP_CACHE_LOOKUPS.labels('miss').inc()
+        self.db.put_http_cache_entry(
+            self.make_key(path, params),
+            headers.get('ETag'),
+            headers.get('Last-Modified'),
+            body,
+            time.time()
+        )
+        
+        self.stores += 1
+        if self.stores % EVICT_EVERY == 0:
+            evicted = self.db.evict_http_cache(self.max_entries)
+            if evicted:
+                logger.debug(f"Evicted {evicted} HTTP cache entries")
+
+    @staticmethod
+    def decode(entry: Dict):
+        return json.loads(entry['body'])
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            'hits': self.hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.revalidated) / lookups if lookups else 0.0,
+        }
@@ -1,7 +1,8 @@
 # imghdr.py – remplacement simple du module supprimé
-from PIL import Image
 
 def what(file, h=None):
+    # Pillow is only loaded the first time something asks for an image type.
+    from PIL import Image
     try:
         with Image.open(file) as img:
             return img.format.lower()
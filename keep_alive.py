@@ -1,6 +1,8 @@
-from flask import Flask
+from flask import Flask, Response
 from threading import Thread
 import logging
+import metrics
+from webhook import HOME_PAGE
 
 logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
@@ -8,20 +10,17 @@ app = Flask('')
 
 @app.route('/')
 def home():
-    return """
-    <html>
-        <head><title>Discogs Bot</title></head>
-        <body>
-            <h1>🎵 Discogs Wantlist Bot</h1>
-            <p>✅ Bot is active and monitoring your wantlist!</p>
-        </body>
-    </html>
-    """
+    return HOME_PAGE
 
-def run():
-    app.run(host='0.0.0.0', port=3000)
+@app.route('/metrics')
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
-def keep_alive():
-    t = Thread(target=run)
+def run(port=3000):
+    app.run(host='0.0.0.0', port=port)
+
+def keep_alive(port=3000):
+    t = Thread(target=run, args=(port,))
     t.daemon = True
     t.start()
@@ -1,13 +1,28 @@
+import time
+
+# Taken before anything heavy is imported; startup is reported from here.
+PROCESS_STARTED = time.perf_counter()
+
 import logging
 import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from config import Config
 from database import Database
-from discogs_handler import search_release, get_release_info, format_release_info
+from discogs_client import DiscogsClient
+from http_cache import ResponseCache
+from wantlist_sync import WantlistSync
+from release_scheduler import ReleaseScheduler
+from rate_limiter import RateLimiter
+from notifications import NotificationOutbox
+from release_metadata import ReleaseMetadataCache, ReleaseEnricher
+from cycle_coordinator import CycleCoordinator
+from filters import ListingFilter, parse_rates
+from scan_worker import ScanWorkerPool
 from bot import TelegramBot
-from keep_alive import keep_alive
-import re
+import metrics
+
+IMPORT_SECONDS = time.perf_counter() - PROCESS_STARTED
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,71 +34,131 @@ logger = logging.getLogger(__name__)
 
 class DiscogerBot:
     def __init__(self):
+        init_started = time.perf_counter()
         Config.validate()
         
-        self.db = Database()
-        self.discogs = none
-        self.bot = TelegramBot(Config.TELEGRAM_BOT_TOKEN)
+        self.db = Database(
+            seen_index_max=Config.SEEN_INDEX_MAX_ENTRIES,
+            shared=bool(Config.DISCOGS_SCAN_TOKENS),
+            defer_seen_index=True
+        )
+        self.db.bootstrap_owner(Config.DISCOGS_USERNAME, Config.owner_chat_ids())
+        self.limiter = RateLimiter(Config.DISCOGS_REQUESTS_PER_MINUTE)
+        self.discogs = DiscogsClient(
+            Config.DISCOGS_TOKEN,
+            Config.DISCOGS_USERNAME,
+            self.limiter,
+            max_connections=Config.FETCH_WORKERS,
+            cache=ResponseCache(self.db, Config.HTTP_CACHE_MAX_ENTRIES),
+            base_url=Config.DISCOGS_API_URL
+        )
+        self.fetch_slots = asyncio.Semaphore(Config.FETCH_WORKERS)
+        self.scan_workers = None
+        if Config.DISCOGS_SCAN_TOKENS:
+            self.scan_workers = ScanWorkerPool(Config.DISCOGS_SCAN_TOKENS, self.db.db_path)
+        self.wantlist_sync = WantlistSync(
+            self.db,
+            self.discogs,
+            Config.WANTLIST_FULL_SYNC_HOURS,
+            owner_username=Config.DISCOGS_USERNAME
+        )
+        self.release_scheduler = ReleaseScheduler(
+            Config.CHECK_INTERVAL_MINUTES,
+            Config.MIN_POLL_MINUTES,
+            Config.MAX_POLL_HOURS
+        )
+        self.cycles = CycleCoordinator()
+        self.listing_filter = ListingFilter(parse_rates(Config.CURRENCY_RATES))
+        self.listing_filter.load(self.db.get_filter_rules())
+        self.wantlist = {}
+        self.release_chats = {}
+        self.wantlist_synced_at = None
+        self.bot = TelegramBot(
+            Config.TELEGRAM_BOT_TOKEN,
+            db=self.db,
+            http_cache=self.discogs.cache,
+            owner_username=Config.DISCOGS_USERNAME,
+            api_url=Config.TELEGRAM_API_URL
+        )
+        self.webhook = None
+        if Config.TELEGRAM_WEBHOOK_URL:
+            from webhook import WebhookServer
+            self.webhook = WebhookServer(
+                self.bot.app,
+                Config.TELEGRAM_WEBHOOK_URL,
+                Config.webhook_secret(),
+                port=Config.WEB_PORT
+            )
+        self.release_metadata = ReleaseMetadataCache(
+            self.db,
+            Config.RELEASE_METADATA_CACHE_ENTRIES,
+            Config.RELEASE_METADATA_TTL_MINUTES * 60
+        )
+        self.enricher = ReleaseEnricher(
+            self.db,
+            self.discogs,
+            self.release_metadata,
+            Config.ENRICH_BATCH_SIZE,
+            Config.ENRICH_INTERVAL_MINUTES * 60
+        )
+        self.outbox = NotificationOutbox(self.db, self.bot, metadata=self.release_metadata)
+        metrics.OUTBOX_PENDING.set_function(self.db.get_pending_notifications_count)
+        if self.scan_workers:
+            metrics.SCAN_QUEUE_DEPTH.set_function(self.db.get_scan_queue_depth)
         self.scheduler = AsyncIOScheduler()
         
         self.bot.app.bot_data['interval'] = Config.CHECK_INTERVAL_MINUTES
+        self.init_seconds = time.perf_counter() - init_started
         
-    async def check_wantlist(self) -> int:
+    async def refresh_wantlist(self) -> list:
+        wantlist = await self.wantlist_sync.sync()
+        self.wantlist = {item['release_id']: item for item in wantlist}
+        self.release_chats = await asyncio.to_thread(self.db.get_release_subscriptions)
+        self.wantlist_synced_at = time.monotonic()
+        metrics.WANTLIST_RELEASES.set(len(self.wantlist))
+        self.enricher.wake()
+        
+        stats = await asyncio.to_thread(self.db.get_release_poll_stats)
+        self.release_scheduler.load(stats)
+        logger.info(
+            f"Polling {len(self.release_scheduler)} releases, "
+            f"~{self.release_scheduler.calls_per_hour():.0f} calls/hour"
+        )
+        return wantlist
+    
+    async def check_wantlist(self, resume: bool = False) -> int:
+        return await self.cycles.run_full(lambda: self.run_full_check(resume))
+    
+    async def poll_due_releases(self) -> int:
+        return await self.cycles.run_poll(self.poll_releases)
+    
+    async def run_full_check(self, resume: bool = False) -> int:
         logger.info("Starting wantlist check...")
         new_listings_count = 0
         
         try:
-            wantlist = await asyncio.to_thread(self.discogs.get_wantlist)
+            wantlist = await self.refresh_wantlist()
             
             if not wantlist:
                 logger.warning("Wantlist is empty or could not be fetched")
                 return 0
             
-            logger.info(f"Checking {len(wantlist)} items in wantlist...")
-            
-            for item in wantlist:
-                release_id = item['release_id']
-                
-                await asyncio.to_thread(
-                    self.db.cache_wantlist_item,
-                    release_id,
-                    item['artist'],
-                    item['title'],
-                    item['url']
-                )
-                
-                listings = await asyncio.to_thread(
-                    self.discogs.get_marketplace_listings, 
-                    release_id
+            cycle = await asyncio.to_thread(self.db.get_unfinished_check_cycle) if resume else None
+            if resume:
+                wantlist = await self.skip_fresh_releases(wantlist, cycle)
+            if cycle:
+                cycle_id = cycle['cycle_id']
+                logger.info(
+                    f"Resuming check cycle {cycle_id} after release {cycle['last_release_id']} "
+                    f"({cycle['releases_done']}/{cycle['releases_total']} done)"
                 )
-                
-                for listing in listings:
-                    listing_id = listing['listing_id']
-                    
-                    is_seen = await asyncio.to_thread(
-                        self.db.is_listing_seen, 
-                        release_id, 
-                        listing_id
-                    )
-                    
-                    if not is_seen:
-                        await self.send_listing_notification(item, listing)
-                        
-                        await asyncio.to_thread(
-                            self.db.mark_listing_seen,
-                            release_id,
-                            listing_id,
-                            listing['price'],
-                            listing['condition'],
-                            listing['seller_username'],
-                            listing['url']
-                        )
-                        
-                        new_listings_count += 1
-                        await asyncio.sleep(1)
-                
-                await asyncio.sleep(2)
+            else:
+                cycle_id = await asyncio.to_thread(self.db.start_check_cycle, len(wantlist))
             
+            logger.info(f"Checking {len(wantlist)} items in wantlist...")
+            with metrics.CYCLE_SECONDS.labels('full').time():
+                new_listings_count = await self.scan_releases(wantlist, cycle_id)
+            await asyncio.to_thread(self.db.finish_check_cycle, cycle_id)
             logger.info(f"Wantlist check complete. Found {new_listings_count} new listings.")
             
         except Exception as e:
@@ -91,76 +166,254 @@ class DiscogerBot:
         
         return new_listings_count
     
-    def escape_markdown(self, text: str) -> str:
-        escape_chars = r'_*[]()~`>#+-=|{}.!'
-        return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', str(text))
+    async def skip_fresh_releases(self, wantlist: list, cycle: dict = None) -> list:
+        # Anything polled within the freshness window, or already finished by
+        # the cycle a restart interrupted, does not need fetching again.
+        since = time.time() - Config.RESUME_FRESHNESS_MINUTES * 60
+        if cycle:
+            since = min(since, cycle['started_at'])
+        
+        fresh = await asyncio.to_thread(self.db.get_releases_polled_since, since)
+        remaining = [item for item in wantlist if item['release_id'] not in fresh]
+        if len(remaining) < len(wantlist):
+            logger.info(f"Skipping {len(wantlist) - len(remaining)} recently polled releases")
+        return remaining
     
-    async def send_listing_notification(self, item: dict, listing: dict):
-        artist = self.escape_markdown(item['artist'])
-        title = self.escape_markdown(item['title'])
-        year = self.escape_markdown(item.get('year', 'N/A'))
-        price = self.escape_markdown(listing['price'])
-        condition = self.escape_markdown(listing['condition'])
-        sleeve = self.escape_markdown(listing.get('sleeve_condition', 'N/A'))
-        seller = self.escape_markdown(listing['seller_username'])
-        rating = self.escape_markdown(listing.get('seller_rating', 'N/A'))
-        ships = self.escape_markdown(listing.get('ships_from', 'N/A'))
-        
-        message = (
-            f"🎵 *NEW LISTING FOUND\\!*\n\n"
-            f"*Artist:* {artist}\n"
-            f"*Title:* {title}\n"
-            f"*Year:* {year}\n\n"
-            f"💰 *Price:* {price}\n"
-            f"📀 *Condition:* {condition}\n"
-            f"📦 *Sleeve:* {sleeve}\n"
-            f"👤 *Seller:* {seller} \\({rating}%\\)\n"
-            f"🌍 *Ships from:* {ships}\n\n"
-        )
+    async def poll_releases(self) -> int:
+        new_listings_count = 0
+        
+        try:
+            sync_age = None if self.wantlist_synced_at is None else time.monotonic() - self.wantlist_synced_at
+            if sync_age is None or sync_age >= Config.CHECK_INTERVAL_MINUTES * 60:
+                await self.refresh_wantlist()
+            
+            tokens = len(self.scan_workers) if self.scan_workers else 1
+            budget = int(tokens * self.limiter.capacity * Config.POLL_TICK_MINUTES * Config.POLL_QUOTA_SHARE)
+            due = [
+                self.wantlist[release_id]
+                for release_id in self.release_scheduler.pop_due(budget)
+                if release_id in self.wantlist
+            ]
+            if not due:
+                return 0
+            
+            with metrics.CYCLE_SECONDS.labels('poll').time():
+                new_listings_count = await self.scan_releases(due)
+            logger.info(f"Polled {len(due)} due releases, {new_listings_count} new listings")
+            
+        except Exception as e:
+            logger.error(f"Error during release poll: {e}")
         
-        if listing.get('comments'):
-            comments_raw = listing['comments'][:200]
-            comments = self.escape_markdown(comments_raw)
-            ellipsis = '\\.\\.\\.' if len(listing['comments']) > 200 else ''
-            message += f"💬 *Comments:* {comments}{ellipsis}\n\n"
+        return new_listings_count
+    
+    async def scan_releases(self, items: list, cycle_id: int = None) -> int:
+        if self.scan_workers:
+            return await self.dispatch_scans(items, cycle_id)
         
-        message += f"🔗 [View Listing]({listing['url']})\n"
-        message += f"🔗 [View Release]({item['url']})"
+        new_listings_count = 0
         
-        await self.bot.send_notification(message)
+        for coro in asyncio.as_completed([self.fetch_listings(item) for item in items]):
+            item, listings, complete = await coro
+            release_id = item['release_id']
+            if listings is None:
+                # The fetch failed: no checkpoint, so the release is neither
+                # counted done in the cycle nor skipped as fresh after a
+                # restart, and it is retried soon instead of backed off.
+                self.release_scheduler.record_failure(release_id)
+                continue
+            
+            # Each release is fetched once no matter how many users want it;
+            # new listings fan out to every subscribed chat. Every release is
+            # its own checkpoint, so a crash mid-cycle loses at most the
+            # fetches still in flight, and one that fails to record is
+            # rolled back and left for the next cycle without stopping this one.
+            try:
+                new_listings = await asyncio.to_thread(
+                    self.db.record_release_scan,
+                    item,
+                    listings,
+                    self.release_chats.get(release_id),
+                    cycle_id,
+                    listing_filter=self.listing_filter,
+                    rates=self.listing_filter.rates,
+                    complete=complete
+                )
+            except Exception as e:
+                logger.error(f"Error recording scan of release {release_id}: {e}")
+                self.release_scheduler.record_failure(release_id)
+                continue
+            self.release_scheduler.record(release_id, len(new_listings))
+            new_listings_count += len(new_listings)
+            if new_listings:
+                self.outbox.wake()
+        
+        if new_listings_count:
+            metrics.NEW_LISTINGS.inc(new_listings_count)
+        return new_listings_count
+    
+    async def dispatch_scans(self, items: list, cycle_id: int = None) -> int:
+        # Sharded mode: workers claim releases from scan_queue, each with
+        # its own token, and write seen marks and outbox rows themselves.
+        # This waits for the batch so cycles still never overlap. A large
+        # cycle can rightly take hours, so the wait is only cut short when
+        # no scan has finished for the stall timeout: workers that keep
+        # dying cannot hold the cycle lock forever.
+        await asyncio.to_thread(self.db.enqueue_scans, items, self.release_chats, cycle_id)
+        remaining = {item['release_id'] for item in items}
+        new_listings_count = 0
+        stall_seconds = Config.SCAN_STALL_TIMEOUT_MINUTES * 60
+        deadline = time.monotonic() + stall_seconds
+        
+        while remaining:
+            if time.monotonic() >= deadline:
+                cancelled = await asyncio.to_thread(self.db.cancel_scans, list(remaining))
+                for release_id in remaining:
+                    self.release_scheduler.record_failure(release_id)
+                logger.error(
+                    f"Scan cycle stalled with {len(remaining)} release(s) unfinished, "
+                    f"{cancelled} dropped from the queue: {', '.join(sorted(remaining)[:20])}"
+                )
+                break
+            await asyncio.sleep(0.5)
+            self.scan_workers.ensure_alive()
+            
+            finished = await asyncio.to_thread(self.db.collect_finished_scans)
+            if finished:
+                deadline = time.monotonic() + stall_seconds
+            for release_id, new_listings in finished:
+                if new_listings is None:
+                    self.release_scheduler.record_failure(release_id)
+                else:
+                    self.release_scheduler.record(release_id, new_listings)
+                    new_listings_count += new_listings
+                remaining.discard(release_id)
+            if any(new_listings for _, new_listings in finished):
+                self.outbox.wake()
+        
+        if new_listings_count:
+            metrics.NEW_LISTINGS.inc(new_listings_count)
+        return new_listings_count
+    
+    async def set_favorite(self, release_id: str, favorite: bool) -> bool:
+        found = await asyncio.to_thread(self.db.set_favorite, release_id, favorite)
+        if found:
+            self.release_scheduler.set_favorite(release_id, favorite)
+        return found
+    
+    async def set_filter(self, chat_id: int, release_id: str, rule: dict) -> bool:
+        if rule is None:
+            changed = await asyncio.to_thread(self.db.delete_filter_rule, chat_id, release_id)
+        else:
+            await asyncio.to_thread(self.db.set_filter_rule, chat_id, release_id, rule)
+            changed = True
+        rules = await asyncio.to_thread(self.db.get_filter_rules)
+        self.listing_filter.load(rules)
+        return changed
+    
+    async def fetch_listings(self, item: dict) -> tuple:
+        # Pacing is left to the shared rate limiter; the semaphore only
+        # bounds how many requests are in flight at once.
+        release_id = item['release_id']
+        
+        def reached_seen(listing_ids):
+            return asyncio.to_thread(self.db.reached_seen_listings, release_id, listing_ids)
+        
+        try:
+            async with self.fetch_slots:
+                listings, complete = await self.discogs.get_new_marketplace_listings(
+                    release_id, reached_seen, Config.MARKETPLACE_MAX_PAGES
+                )
+        except Exception as e:
+            logger.error(f"Error fetching listings for release {release_id}: {e}")
+            listings, complete = None, None
+        return item, listings, complete
+    
+    async def run_maintenance(self):
+        try:
+            stats = await asyncio.to_thread(
+                self.db.run_maintenance,
+                Config.SEEN_RETENTION_DAYS,
+                Config.PRICE_HISTORY_RETENTION_DAYS
+            )
+            logger.info(
+                f"Database maintenance: removed {stats['seen_listings']} seen listings, "
+                f"{stats['price_history']} price observations, "
+                f"{stats['failed_notifications']} failed notifications; "
+                f"freed {stats['pages_freed']} pages"
+            )
+        except Exception as e:
+            logger.error(f"Error during database maintenance: {e}")
     
     def schedule_checks(self):
         self.scheduler.add_job(
-            self.check_wantlist,
-            trigger=IntervalTrigger(minutes=Config.CHECK_INTERVAL_MINUTES),
-            id='wantlist_check',
-            name='Check Discogs Wantlist',
-            replace_existing=True
+            self.poll_due_releases,
+            trigger=IntervalTrigger(minutes=Config.POLL_TICK_MINUTES),
+            id='release_poll',
+            name='Poll Due Releases',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=None
+        )
+        
+        self.scheduler.add_job(
+            self.run_maintenance,
+            trigger=IntervalTrigger(hours=Config.MAINTENANCE_HOURS),
+            id='db_maintenance',
+            name='Database Maintenance',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
         )
         
         self.scheduler.start()
-        logger.info(f"Scheduled wantlist checks every {Config.CHECK_INTERVAL_MINUTES} minutes")
+        logger.info(
+            f"Scheduled release polling every {Config.POLL_TICK_MINUTES} minute(s), "
+            f"base interval {Config.CHECK_INTERVAL_MINUTES} minutes"
+        )
     
     async def initial_check(self):
+        # Loaded here rather than in Database() so Telegram is already
+        # answering; until then lookups go to SQLite.
+        try:
+            await asyncio.to_thread(self.db.load_seen_index)
+        except Exception as e:
+            logger.error(f"Error loading seen index: {e}")
         await asyncio.sleep(5)
         logger.info("Running initial wantlist check...")
-        await self.check_wantlist()
+        await self.check_wantlist(resume=True)
     
     async def async_run(self):
         logger.info("=== Discoger Bot Starting ===")
-        logger.info(f"Discogs Username: {Config.DISCOGS_USERNAME}")
+        logger.info(f"Owner Discogs Username: {Config.DISCOGS_USERNAME}")
         logger.info(f"Check Interval: {Config.CHECK_INTERVAL_MINUTES} minutes")
         
         self.bot.set_check_callback(self.check_wantlist)
+        self.bot.set_favorite_callback(self.set_favorite)
+        self.bot.set_filter_callback(self.set_filter)
         self.bot.setup_handlers()
         
-        self.schedule_checks()
+        if self.scan_workers:
+            await asyncio.to_thread(self.db.release_scans)
+            self.scan_workers.start()
         
-        asyncio.create_task(self.initial_check())
+        self.schedule_checks()
         
+        telegram_started = time.perf_counter()
         async with self.bot.app:
             await self.bot.app.start()
-            await self.bot.app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            if self.webhook:
+                await self.webhook.start()
+            else:
+                await self.bot.app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            logger.info(
+                f"Startup: imports {IMPORT_SECONDS:.2f}s, init {self.init_seconds:.2f}s, "
+                f"Telegram {time.perf_counter() - telegram_started:.2f}s; "
+                f"receiving updates {time.perf_counter() - PROCESS_STARTED:.2f}s after launch"
+            )
+            asyncio.create_task(self.initial_check())
+            sender = asyncio.create_task(self.outbox.run())
+            enricher = asyncio.create_task(self.enricher.run())
             
             logger.info("Bot is running. Press Ctrl+C to stop.")
             
@@ -169,16 +422,28 @@ class DiscogerBot:
             except (KeyboardInterrupt, SystemExit):
                 logger.info("Shutting down...")
             finally:
-                await self.bot.app.updater.stop()
+                sender.cancel()
+                enricher.cancel()
+                if self.scan_workers:
+                    self.scan_workers.stop()
+                if self.webhook:
+                    await self.webhook.stop()
+                else:
+                    await self.bot.app.updater.stop()
                 await self.bot.app.stop()
+                await self.discogs.close()
+                self.db.close()
 
 
 if __name__ == "__main__":
     try:
         from telegram import Update
         
-        keep_alive()
-        logger.info("Keep-alive web server started on port 3000")
+        if not Config.TELEGRAM_WEBHOOK_URL:
+            # Webhook mode serves / and /metrics itself; no Flask thread.
+            from keep_alive import keep_alive
+            keep_alive(Config.WEB_PORT)
+            logger.info(f"Keep-alive web server started on port {Config.WEB_PORT}")
         
         bot = DiscogerBot()
         asyncio.run(bot.async_run())
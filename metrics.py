@@ -0,0 +1,128 @@
+"""Prometheus metrics for the check cycle.
+
+Everything lives in the default prometheus_client registry, which the
+keep-alive Flask app, or the webhook server in webhook mode, exposes at
+/metrics. Observing a histogram or bumping a
+counter is a lock plus a float add, so these are safe to call per request.
+"""
+import re
+import time
+from functools import wraps
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Discogs answers in ~100ms-2s; DB calls are mostly sub-millisecond.
+NETWORK_BUCKETS = (.025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (.0001, .0005, .001, .005, .01, .05, .1, .5, 1)
+CYCLE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+DISCOGS_REQUEST_SECONDS = Histogram(
+    'discoger_discogs_request_seconds',
+    'Discogs API request latency per attempt',
+    ['endpoint'],
+    buckets=NETWORK_BUCKETS
+)
+DB_OPERATION_SECONDS = Histogram(
+    'discoger_db_operation_seconds',
+    'SQLite operation latency',
+    ['operation'],
+    buckets=DB_BUCKETS
+)
+TELEGRAM_SEND_SECONDS = Histogram(
+    'discoger_telegram_send_seconds',
+    'Telegram sendMessage latency',
+    buckets=NETWORK_BUCKETS
+)
+CYCLE_SECONDS = Histogram(
+    'discoger_check_cycle_seconds',
+    'Duration of a full wantlist check or a due-release poll',
+    ['kind'],
+    buckets=CYCLE_BUCKETS
+)
+RATE_LIMITED = Counter(
+    'discoger_rate_limited_total',
+    'Responses rejected by upstream rate limiting',
+    ['service']
+)
+RETRIES = Counter(
+    'discoger_retries_total',
+    'Requests retried after a failure',
+    ['service']
+)
+HTTP_CACHE_LOOKUPS = Counter(
+    'discoger_http_cache_lookups_total',
+    'Discogs response cache lookups by result',
+    ['result']
+)
+CYCLES_COALESCED = Counter(
+    'discoger_cycles_coalesced_total',
+    'Check cycles folded into one already running',
+    ['kind']
+)
+NEW_LISTINGS = Counter(
+    'discoger_new_listings_total',
+    'Marketplace listings seen for the first time'
+)
+LISTINGS_FILTERED = Counter(
+    'discoger_listings_filtered_total',
+    'New listings held back from a chat by its filter rules'
+)
+WEBHOOK_UPDATES = Counter(
+    'discoger_webhook_updates_total',
+    'Telegram updates received on the webhook by result',
+    ['result']
+)
+RELEASE_METADATA_LOOKUPS = Counter(
+    'discoger_release_metadata_lookups_total',
+    'In-memory release metadata cache lookups by result',
+    ['result']
+)
+RELEASES_ENRICHED = Counter(
+    'discoger_releases_enriched_total',
+    'Background release metadata fetches by result',
+    ['result']
+)
+NOTIFICATIONS_SENT = Counter(
+    'discoger_notifications_sent_total',
+    'Notification digests delivered to Telegram'
+)
+OUTBOX_PENDING = Gauge(
+    'discoger_outbox_pending',
+    'Notifications waiting in the outbox'
+)
+SCAN_QUEUE_DEPTH = Gauge(
+    'discoger_scan_queue_depth',
+    'Releases queued or claimed for the scan workers'
+)
+WANTLIST_RELEASES = Gauge(
+    'discoger_wantlist_releases',
+    'Distinct releases being polled'
+)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_USER_SEGMENT = re.compile(r'^/users/[^/]+')
+
+
+def endpoint_label(path: str) -> str:
+    """Collapse ids and usernames so each endpoint is a single label value."""
+    path = _USER_SEGMENT.sub('/users/{username}', path)
+    return _ID_SEGMENT.sub('/{id}', path)
+
+
+def timed(histogram, label: str = None):
+    """Decorator observing a sync function's run time, labelled by its name."""
+    def decorator(func):
+        child = histogram.labels(label or func.__name__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def render() -> tuple:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,208 @@
+"""Versioned schema migrations, tracked in PRAGMA user_version.
+
+Database.init_db creates any missing table in its current shape, then
+runs every migration newer than the stored version, in order, each in
+its own transaction. Migrations must cope with both an upgraded database
+and a fresh one where init_db already created the new layout.
+
+init_db skips all of that when the stored version is SCHEMA_VERSION, so
+any change to the schema in init_db, even a new table or index, needs a
+migration here to bump the version.
+"""
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def seen_listings_integer_keys(conn: sqlite3.Connection):
+    """Rebuild seen_listings keyed by integer ids, WITHOUT ROWID.
+
+    Drops the AUTOINCREMENT id and its separate UNIQUE(release_id,
+    listing_id) index over TEXT, stores seen_at as unix seconds, drops the
+    listing_url that can be rebuilt from the listing id, and adds gone_at
+    for retention.
+    """
+    if 'id' in _columns(conn, 'seen_listings'):
+        conn.execute("""
+            CREATE TABLE seen_listings_new (
+                release_id INTEGER NOT NULL,
+                listing_id INTEGER NOT NULL,
+                price TEXT,
+                condition TEXT,
+                seller_username TEXT,
+                seen_at INTEGER NOT NULL,
+                gone_at INTEGER,
+                PRIMARY KEY (release_id, listing_id)
+            ) WITHOUT ROWID
+        """)
+        # Discogs ids are always numeric; anything else was never indexed
+        # and cannot be keyed here.
+        conn.execute("""
+            INSERT OR IGNORE INTO seen_listings_new
+            (release_id, listing_id, price, condition, seller_username, seen_at)
+            SELECT CAST(release_id AS INTEGER), CAST(listing_id AS INTEGER),
+                   price, condition, seller_username,
+                   COALESCE(CAST(strftime('%s', seen_at) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+            FROM seen_listings
+            WHERE release_id NOT GLOB '*[^0-9]*' AND listing_id NOT GLOB '*[^0-9]*'
+              AND release_id != '' AND listing_id != ''
+        """)
+        conn.execute("DROP TABLE seen_listings")
+        conn.execute("ALTER TABLE seen_listings_new RENAME TO seen_listings")
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_seen_listings_gone
+        ON seen_listings(gone_at) WHERE gone_at IS NOT NULL
+    """)
+
+
+def maintained_counts(conn: sqlite3.Connection):
+    """Keep row counts in table_counts via triggers so /status never scans."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS table_counts (
+            name TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO table_counts (name, count)
+        SELECT 'seen_listings', COUNT(*) FROM seen_listings
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS seen_listings_count_insert
+        AFTER INSERT ON seen_listings BEGIN
+            UPDATE table_counts SET count = count + 1 WHERE name = 'seen_listings';
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS seen_listings_count_delete
+        AFTER DELETE ON seen_listings BEGIN
+            UPDATE table_counts SET count = count - 1 WHERE name = 'seen_listings';
+        END
+    """)
+
+
+def incremental_vacuum(conn: sqlite3.Connection):
+    """Switch to auto_vacuum=INCREMENTAL; only takes effect after one full VACUUM."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.commit()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+
+
+def release_metadata_columns(conn: sqlite3.Connection):
+    """Add the enrichment columns (genres, label, thumbnail) to wantlist_cache."""
+    existing = _columns(conn, 'wantlist_cache')
+    for name, col_type in [('genres', 'TEXT'), ('label', 'TEXT'), ('thumb_url', 'TEXT'),
+                           ('enriched_at', 'REAL')]:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE wantlist_cache ADD COLUMN {name} {col_type}")
+
+
+def price_history_observed_index(conn: sqlite3.Connection):
+    """Index observed_at so retention deletes do not scan price_history per batch."""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_price_history_observed
+        ON price_history(observed_at)
+    """)
+
+
+def release_activity_counts(conn: sqlite3.Connection):
+    """Maintain per-release new-listing activity so the poll scheduler never aggregates seen_listings.
+
+    Listings seen within an hour of a release's first scan are the backlog
+    that was already on sale, not new activity, and are not counted.
+    release_activity keeps each release's first scan and latest new
+    listing; release_new_daily counts new listings per release per UTC day.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS release_activity (
+            release_id INTEGER PRIMARY KEY,
+            first_seen_at INTEGER NOT NULL,
+            last_new_at INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS release_new_daily (
+            release_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (release_id, day)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM release_activity")
+    conn.execute("DELETE FROM release_new_daily")
+    conn.execute("""
+        INSERT INTO release_activity (release_id, first_seen_at, last_new_at)
+        SELECT s.release_id, f.first_seen,
+               MAX(CASE WHEN s.seen_at > f.first_seen + 3600 THEN s.seen_at END)
+        FROM seen_listings s
+        JOIN (
+            SELECT release_id, MIN(seen_at) AS first_seen
+            FROM seen_listings
+            GROUP BY release_id
+        ) f ON f.release_id = s.release_id
+        GROUP BY s.release_id
+    """)
+    conn.execute("""
+        INSERT INTO release_new_daily (release_id, day, count)
+        SELECT s.release_id, s.seen_at / 86400, COUNT(*)
+        FROM seen_listings s
+        JOIN release_activity a ON a.release_id = s.release_id
+        WHERE s.seen_at > a.first_seen_at + 3600
+        GROUP BY s.release_id, s.seen_at / 86400
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS seen_listings_activity_insert
+        AFTER INSERT ON seen_listings BEGIN
+            INSERT OR IGNORE INTO release_activity (release_id, first_seen_at)
+            VALUES (NEW.release_id, NEW.seen_at);
+            UPDATE release_activity SET last_new_at = MAX(COALESCE(last_new_at, 0), NEW.seen_at)
+            WHERE release_id = NEW.release_id AND NEW.seen_at > first_seen_at + 3600;
+            INSERT INTO release_new_daily (release_id, day, count)
+            SELECT NEW.release_id, NEW.seen_at / 86400, 1
+            FROM release_activity
+            WHERE release_id = NEW.release_id AND NEW.seen_at > first_seen_at + 3600
+            ON CONFLICT (release_id, day) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+
+MIGRATIONS = [
+    (1, seen_listings_integer_keys),
+    (2, maintained_counts),
+    (3, incremental_vacuum),
+    (4, release_metadata_columns),
+    (5, price_history_observed_index),
+    (6, release_activity_counts),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Run pending migrations and return the schema version reached."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Migrating database to version {target}: {migration.__name__}")
+        try:
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+
+    return version
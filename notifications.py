@@ -0,0 +1,221 @@
+import asyncio
+import re
+import time
+import logging
+from typing import List, Dict
+from telegram.error import TelegramError, RetryAfter, NetworkError, TimedOut
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4000
+DEFAULT_CHAT = 0
+
+
+def escape_markdown(text) -> str:
+    escape_chars = r'_*[]()~`>#+-=|{}.!'
+    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', str(text))
+
+
+def escape_url(url: str) -> str:
+    return re.sub(r'([)\\])', r'\\\1', str(url))
+
+
+def format_release_header(item: Dict) -> str:
+    artist = escape_markdown(item['artist'])
+    title = escape_markdown(item['title'])
+    year = escape_markdown(item.get('year', 'N/A'))
+    header = (
+        f"*Artist:* {artist}\n"
+        f"*Title:* {title}\n"
+        f"*Year:* {year}\n"
+    )
+    if item.get('label'):
+        header += f"*Label:* {escape_markdown(item['label'])}\n"
+    if item.get('genres'):
+        header += f"*Genres:* {escape_markdown(item['genres'])}\n"
+    return header + "\n"
+
+
+def format_listing(item: Dict, listing: Dict) -> str:
+    price = escape_markdown(listing['price'])
+    condition = escape_markdown(listing['condition'])
+    sleeve = escape_markdown(listing.get('sleeve_condition', 'N/A'))
+    seller = escape_markdown(listing['seller_username'])
+    rating = escape_markdown(listing.get('seller_rating', 'N/A'))
+    ships = escape_markdown(listing.get('ships_from', 'N/A'))
+    
+    message = (
+        f"🎵 *NEW LISTING FOUND\\!*\n\n"
+        f"{format_release_header(item)}"
+        f"💰 *Price:* {price}\n"
+        f"📀 *Condition:* {condition}\n"
+        f"📦 *Sleeve:* {sleeve}\n"
+        f"👤 *Seller:* {seller} \\({rating}%\\)\n"
+        f"🌍 *Ships from:* {ships}\n\n"
+    )
+    
+    if listing.get('comments'):
+        comments_raw = listing['comments'][:200]
+        comments = escape_markdown(comments_raw)
+        ellipsis = '\\.\\.\\.' if len(listing['comments']) > 200 else ''
+        message += f"💬 *Comments:* {comments}{ellipsis}\n\n"
+    
+    message += f"🔗 [View Listing]({escape_url(listing['url'])})\n"
+    message += f"🔗 [View Release]({escape_url(item['url'])})"
+    return message
+
+
+def format_digest(item: Dict, listings: List[Dict]) -> List[str]:
+    """One message per release; split only if Telegram's length limit forces it."""
+    if len(listings) == 1:
+        return [format_listing(item, listings[0])]
+    
+    footer = f"🔗 [View Release]({escape_url(item['url'])})"
+    lines = []
+    for listing in listings:
+        price = escape_markdown(listing['price'])
+        condition = escape_markdown(listing['condition'])
+        sleeve = escape_markdown(listing.get('sleeve_condition', 'N/A'))
+        seller = escape_markdown(listing['seller_username'])
+        rating = escape_markdown(listing.get('seller_rating', 'N/A'))
+        ships = escape_markdown(listing.get('ships_from', 'N/A'))
+        lines.append(
+            f"💰 *{price}* • {condition} / {sleeve}\n"
+            f"👤 {seller} \\({rating}%\\) • 🌍 {ships}\n"
+            f"🔗 [View Listing]({escape_url(listing['url'])})\n\n"
+        )
+    
+    messages = []
+    chunk = []
+    size = 0
+    for line in lines:
+        if chunk and size + len(line) > MAX_MESSAGE_LENGTH - 500:
+            messages.append(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line)
+    messages.append(chunk)
+    
+    header = format_release_header(item)
+    return [
+        f"🎵 *{len(listings)} NEW LISTINGS FOUND\\!*"
+        f"{escape_markdown(f' ({i + 1}/{len(messages)})') if len(messages) > 1 else ''}\n\n"
+        f"{header}{''.join(chunk)}{footer}"
+        for i, chunk in enumerate(messages)
+    ]
+
+
+class NotificationOutbox:
+    """Delivers rows from the notification_outbox table, independently of scanning.
+
+    Listings are enqueued in the same transaction that marks them seen, so
+    a crash can at worst repeat a notification, never drop one. Rows for the
+    same chat and release are coalesced into one digest message. Rows queued
+    for chat 0 wait until a chat claims the owner's wantlist. Release
+    metadata enriched after a row was queued is read from metadata, which
+    never touches the network.
+    """
+
+    def __init__(self, db, bot, per_chat_interval: float = 1.0, poll_seconds: float = 5.0,
+                 max_attempts: int = 8, batch_size: int = 500, metadata=None):
+        self.db = db
+        self.bot = bot
+        self.metadata = metadata
+        self.per_chat_interval = per_chat_interval
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.last_sent = {}
+        self.wakeup = asyncio.Event()
+
+    def wake(self):
+        self.wakeup.set()
+
+    async def run(self):
+        logger.info("Notification outbox sender started")
+        while True:
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error draining notification outbox: {e}")
+            
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def drain(self) -> int:
+        sent = 0
+        while True:
+            rows = await asyncio.to_thread(
+                self.db.get_pending_notifications, time.time(), self.batch_size
+            )
+            if not rows:
+                return sent
+            
+            groups = {}
+            for row in rows:
+                groups.setdefault((row['chat_id'], row['release_id']), []).append(row)
+            
+            for (chat_id, release_id), group in groups.items():
+                if await self.deliver(chat_id, group):
+                    sent += len(group)
+            
+            if len(rows) < self.batch_size:
+                return sent
+
+    async def deliver(self, chat_id: int, rows: List[Dict]) -> bool:
+        item = rows[0]['item']
+        if self.metadata is not None:
+            item = {**item, **await self.metadata.get(item['release_id'])}
+        messages = format_digest(item, [row['listing'] for row in rows])
+        ids = [row['id'] for row in rows]
+        
+        try:
+            for message in messages:
+                await self.wait_for_slot(chat_id)
+                await self.send(chat_id, message)
+        except TelegramError as e:
+            # Connection trouble is retried indefinitely; anything Telegram
+            # actively rejects (bad request, blocked bot) is parked as failed
+            # after max_attempts so it stays inspectable instead of vanishing.
+            attempts = max(row['attempts'] for row in rows) + 1
+            transient = isinstance(e, TimedOut) or type(e) is NetworkError
+            if not transient and attempts >= self.max_attempts:
+                await asyncio.to_thread(self.db.fail_notifications, ids, str(e))
+                logger.error(f"Giving up on {len(ids)} notification(s) for release {item['release_id']}: {e}")
+            else:
+                delay = min(3600, 2 ** attempts * 5)
+                metrics.RETRIES.labels('telegram').inc()
+                await asyncio.to_thread(self.db.retry_notifications, ids, time.time() + delay, str(e))
+                logger.warning(f"Notification for release {item['release_id']} failed, retrying in {delay}s: {e}")
+            return False
+        
+        await asyncio.to_thread(self.db.mark_notifications_sent, ids)
+        metrics.NOTIFICATIONS_SENT.inc(len(messages))
+        return True
+
+    async def send(self, chat_id: int, message: str):
+        while True:
+            try:
+                start = time.perf_counter()
+                await self.bot.send_notification(message, chat_id)
+                metrics.TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start)
+                self.last_sent[chat_id] = time.monotonic()
+                return
+            except RetryAfter as e:
+                metrics.RATE_LIMITED.labels('telegram').inc()
+                retry_after = getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()
+                logger.warning(f"Telegram flood control, waiting {retry_after}s")
+                await asyncio.sleep(retry_after)
+
+    async def wait_for_slot(self, chat_id: int):
+        last = self.last_sent.get(chat_id)
+        if last is not None:
+            wait = self.per_chat_interval - (time.monotonic() - last)
+            if wait > 0:
+                await asyncio.sleep(wait)
@@ -0,0 +1,168 @@
+"""Marketplace price history and its columnar export.
+
+Every scan compares each listing's (price, currency, condition) with the
+last one recorded in listing_prices and appends a price_history row only
+when it changed, so a listing that sits unchanged for months costs one
+row, while drops and bumps each get their own. Per-release min / median /
+last asking prices, in USD cents, are kept in release_price_stats and
+refreshed each scan from every listing still in listing_prices (a scan
+usually fetches only the newest page), so /stats never reads the history.
+
+    python price_history.py export prices.parquet
+
+writes the history as Parquet when pyarrow is installed, and otherwise as
+a .cols zip holding one packed array per column plus a schema.json.
+"""
+import argparse
+import importlib.util
+import json
+import sys
+import zipfile
+from array import array
+from typing import Dict, List, Optional
+from filters import condition_rank
+from discogs_client import MARKETPLACE_PAGE_SIZE
+
+# Only the export needs pyarrow; do not load it on every bot start.
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+EXPORT_COLUMNS = [
+    ('release_id', 'q'),
+    ('listing_id', 'q'),
+    ('observed_at', 'q'),
+    ('price_cents', 'q'),
+    ('currency', 'str'),
+    ('condition', 'b'),
+]
+
+
+def price_cents(listing: Dict) -> Optional[int]:
+    value = listing.get('price_value')
+    if value is None:
+        return None
+    try:
+        return round(float(value) * 100)
+    except (TypeError, ValueError):
+        return None
+
+
+def observe(listings: List[Dict]) -> List[tuple]:
+    """The (listing_id, price_cents, currency, condition rank) rows of a
+    fetched batch, to compare against listing_prices."""
+    rows = []
+    for listing in listings:
+        cents = price_cents(listing)
+        if cents is None:
+            continue
+        try:
+            listing_id = int(listing['listing_id'])
+        except ValueError:
+            continue
+        rank = condition_rank(listing.get('condition'))
+        rows.append((listing_id, cents, listing.get('currency'), -1 if rank is None else rank))
+    return rows
+
+
+def price_stats(prices: Dict[int, tuple], rates: Dict[str, float]) -> Optional[Dict]:
+    """Asking-price stats in USD cents over {listing_id: (price_cents, currency, ...)}.
+
+    Last is the newest listing's price. None when nothing could be priced.
+    """
+    usd = {}
+    for listing_id, (cents, currency, *_) in prices.items():
+        rate = rates.get(currency)
+        if rate is not None:
+            usd[listing_id] = round(cents * rate)
+    if not usd:
+        return None
+    
+    last = usd[max(usd)]
+    values = sorted(usd.values())
+    middle = len(values) // 2
+    median = values[middle] if len(values) % 2 else round((values[middle - 1] + values[middle]) / 2)
+    return {
+        'listings': len(values),
+        'min_cents': values[0],
+        'median_cents': median,
+        'last_cents': last,
+    }
+
+
+def gone_listing_ids(current_ids, batch_ids, complete: bool = None,
+                     page_size: int = MARKETPLACE_PAGE_SIZE) -> set:
+    """Listings we had on record that are no longer for sale.
+
+    A complete batch is the whole marketplace for the release. Otherwise
+    it is only the newest pages, so only listings newer than its oldest can
+    be judged missing. When the fetcher did not say, a batch shorter than
+    one page is taken to be complete.
+    """
+    if complete is None:
+        complete = len(batch_ids) < page_size
+    if not batch_ids and not complete:
+        # Nothing priceable on the newest pages says nothing about the rest.
+        return set()
+    gone = set(current_ids) - set(batch_ids)
+    if gone and not complete:
+        oldest = min(batch_ids)
+        gone = {listing_id for listing_id in gone if listing_id > oldest}
+    return gone
+
+
+def format_cents(cents: Optional[int]) -> str:
+    return "n/a" if cents is None else f"${cents / 100:,.2f}"
+
+
+def export_history(db, path: str) -> int:
+    columns = {name: [] for name, _ in EXPORT_COLUMNS}
+    for row in db.iter_price_history():
+        for (name, _), value in zip(EXPORT_COLUMNS, row):
+            columns[name].append(value)
+    
+    if path.endswith('.parquet'):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed; export to a .cols file instead")
+        import pyarrow
+        import pyarrow.parquet
+        
+        table = pyarrow.table(columns)
+        pyarrow.parquet.write_table(table, path, compression='zstd')
+    else:
+        _write_cols(columns, path)
+    return len(columns['listing_id'])
+
+
+def _write_cols(columns: Dict[str, list], path: str):
+    schema = []
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, typecode in EXPORT_COLUMNS:
+            values = columns[name]
+            if typecode == 'str':
+                data = '\n'.join(value or '' for value in values).encode()
+            else:
+                data = array(typecode, values).tobytes()
+            archive.writestr(f"{name}.bin", data)
+            schema.append({'name': name, 'type': typecode, 'byteorder': sys.byteorder})
+        archive.writestr('schema.json', json.dumps({'rows': len(columns['listing_id']), 'columns': schema}))
+
+
+def main():
+    from database import Database
+    
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='write the price history to a columnar file')
+    export.add_argument('path', help='.parquet (needs pyarrow) or .cols')
+    export.add_argument('--db', default='discoger.db')
+    args = parser.parse_args()
+    
+    db = Database(args.db)
+    try:
+        rows = export_history(db, args.path)
+    finally:
+        db.close()
+    print(f"Exported {rows} price observations to {args.path}")
+
+
+if __name__ == '__main__':
+    main()
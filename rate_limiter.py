@@ -0,0 +1,50 @@
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket shared by every Discogs request.
+
+    Discogs allows 60 authenticated requests per minute over a moving window
+    and reports the live budget in the X-Discogs-Ratelimit-* response headers,
+    so the bucket is clamped to what the server says is left after each call.
+    """
+
+    def __init__(self, requests_per_minute: int = 60):
+        self.capacity = float(requests_per_minute)
+        self.rate = requests_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def update_from_headers(self, headers):
+        limit = headers.get('X-Discogs-Ratelimit')
+        remaining = headers.get('X-Discogs-Ratelimit-Remaining')
+        
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+            self.rate = self.capacity / 60.0
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+
+    def backoff(self, seconds: float):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+        logger.warning(f"Discogs rate limit hit, backing off {seconds:.0f}s")
@@ -0,0 +1,125 @@
+"""Release metadata (year, genres, label, thumbnail) without network calls on the hot path.
+
+The metadata lives in wantlist_cache. The wantlist sync already fills it
+from each want's basic_information, so most releases never need a request
+of their own; ReleaseEnricher fetches /releases/{id} in the background
+for those that arrived without it, a bounded batch every few minutes
+through the shared rate limiter. Notifications and commands only ever
+read: ReleaseMetadataCache keeps recently used releases in memory (LRU,
+with a TTL so enrichment shows up) and falls back to one SQLite read.
+"""
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+from discogs_client import parse_release_metadata
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ReleaseMetadataCache:
+    def __init__(self, db, max_entries: int = 2000, ttl_seconds: float = 3600):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, release_id: str) -> Optional[Dict]:
+        entry = self.entries.get(release_id)
+        if entry is None:
+            return None
+        expires_at, metadata = entry
+        if expires_at <= time.monotonic():
+            del self.entries[release_id]
+            return None
+        self.entries.move_to_end(release_id)
+        return metadata
+
+    def put(self, release_id: str, metadata: Dict):
+        self.entries[release_id] = (time.monotonic() + self.ttl_seconds, metadata)
+        self.entries.move_to_end(release_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, release_id: str):
+        self.entries.pop(release_id, None)
+
+    async def get(self, release_id: str) -> Dict:
+        """Whatever is known about release_id; an empty dict if nothing is yet."""
+        metadata = self.lookup(release_id)
+        if metadata is not None:
+            metrics.RELEASE_METADATA_LOOKUPS.labels('hit').inc()
+            return metadata
+        
+        metrics.RELEASE_METADATA_LOOKUPS.labels('miss').inc()
+        found = await asyncio.to_thread(self.db.get_release_metadata, [release_id])
+        # Releases with nothing known are cached too, so a burst of
+        # notifications for one release costs a single read.
+        metadata = found.get(release_id, {})
+        self.put(release_id, metadata)
+        return metadata
+
+
+class ReleaseEnricher:
+    """Fetches metadata for releases the wantlist sync could not describe."""
+
+    def __init__(self, db, discogs, cache: ReleaseMetadataCache = None, batch_size: int = 20,
+                 interval_seconds: float = 300, retry_hours: float = 24):
+        self.db = db
+        self.discogs = discogs
+        self.cache = cache
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.retry_seconds = retry_hours * 3600
+        self.wakeup = asyncio.Event()
+
+    def wake(self):
+        self.wakeup.set()
+
+    async def run(self):
+        logger.info("Release metadata enricher started")
+        while True:
+            try:
+                await self.enrich_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error enriching release metadata: {e}")
+            
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def enrich_pending(self) -> int:
+        release_ids = await asyncio.to_thread(
+            self.db.get_releases_to_enrich, self.batch_size, time.time() - self.retry_seconds
+        )
+        enriched = 0
+        for release_id in release_ids:
+            # One at a time: this is background work and should never hold
+            # more than one rate-limiter token that polling could use.
+            try:
+                data = await self.discogs.get_release(release_id)
+                metadata = {'year': data.get("year") or 'N/A', **parse_release_metadata(data)}
+            except Exception as e:
+                logger.warning(f"Could not fetch metadata for release {release_id}: {e}")
+                metrics.RELEASES_ENRICHED.labels('failed').inc()
+                await asyncio.to_thread(self.db.update_release_metadata, release_id, None)
+                continue
+            
+            await asyncio.to_thread(self.db.update_release_metadata, release_id, metadata)
+            metrics.RELEASES_ENRICHED.labels('enriched').inc()
+            enriched += 1
+            if self.cache is not None:
+                self.cache.discard(release_id)
+        
+        if release_ids:
+            logger.info(f"Enriched {enriched}/{len(release_ids)} releases with metadata")
+        return enriched
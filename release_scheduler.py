@@ -0,0 +1,155 @@
+import heapq
+import time
+import zlib
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+HOT_WINDOW_DAYS = 30
+MAX_HOT_SPEEDUP = 8
+FAVORITE_SPEEDUP = 4
+QUIET_PERIOD_DAYS = 30
+MAX_BACKOFF_DOUBLINGS = 6
+
+
+def parse_timestamp(value) -> Optional[float]:
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        # SQLite CURRENT_TIMESTAMP is UTC without an offset.
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class ReleaseScheduler:
+    """Per-release polling schedule, kept as a heap of (next_due, release_id).
+
+    A release's interval starts at base_minutes and is
+      * divided by 1 + the number of new listings it had in the last 30 days
+        (at most 8x faster),
+      * divided by 4 again when the user flagged it as a favorite,
+      * doubled for every full 30 days without a new listing (at most 64x),
+    then clamped to [min_minutes, max_hours]. The quiet period is measured
+    from the last new listing in seen_listings.seen_at, or from the date the
+    release was added to the wantlist if it never had one.
+    """
+
+    def __init__(self, base_minutes: float, min_minutes: float = 5, max_hours: float = 24):
+        self.base = base_minutes * 60
+        self.min_interval = min_minutes * 60
+        self.max_interval = max_hours * 3600
+        self.releases = {}
+        self.heap = []
+
+    def __len__(self):
+        return len(self.releases)
+
+    def interval_for(self, state: Dict, now: float) -> float:
+        interval = self.base / min(MAX_HOT_SPEEDUP, 1 + state['recent_new'])
+        
+        if state['favorite']:
+            interval /= FAVORITE_SPEEDUP
+        
+        quiet_since = state['last_new_at'] or state['added_at'] or now
+        quiet_periods = int((now - quiet_since) // (QUIET_PERIOD_DAYS * DAY))
+        if quiet_periods > 0:
+            interval *= 2 ** min(MAX_BACKOFF_DOUBLINGS, quiet_periods)
+        
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def load(self, stats: List[Dict], now: float = None):
+        """Replace the schedule with the given wantlist stats, keeping due times we already had."""
+        now = now or time.time()
+        previous = self.releases
+        self.releases = {}
+        self.heap = []
+        
+        for row in stats:
+            release_id = row['release_id']
+            state = {
+                'favorite': bool(row.get('favorite')),
+                'recent_new': row.get('recent_new') or 0,
+                'last_new_at': parse_timestamp(row.get('last_new_at')),
+                'added_at': parse_timestamp(row.get('date_added')),
+            }
+            state['interval'] = self.interval_for(state, now)
+            
+            last_polled_at = row.get('last_polled_at')
+            if release_id in previous:
+                state['next_due'] = min(previous[release_id]['next_due'], now + state['interval'])
+            elif last_polled_at:
+                # Known from before a restart: keep its place in the rotation.
+                state['next_due'] = min(last_polled_at + state['interval'], now + state['interval'])
+            else:
+                # Spread first polls across one interval so a fresh start
+                # does not make every release due in the same tick.
+                offset = zlib.crc32(release_id.encode()) % 1000 / 1000
+                state['next_due'] = now + state['interval'] * offset
+            
+            self.releases[release_id] = state
+            heapq.heappush(self.heap, (state['next_due'], release_id))
+        
+        logger.info(f"Release scheduler loaded {len(self.releases)} releases")
+
+    def pop_due(self, limit: int, now: float = None) -> List[str]:
+        now = now or time.time()
+        due = []
+        
+        while self.heap and len(due) < limit and self.heap[0][0] <= now:
+            next_due, release_id = heapq.heappop(self.heap)
+            state = self.releases.get(release_id)
+            # Entries are never removed in place; skip ones that were
+            # rescheduled or dropped from the wantlist since.
+            if state is None or state['next_due'] != next_due:
+                continue
+            due.append(release_id)
+        
+        return due
+
+    def record(self, release_id: str, new_listings: int, now: float = None):
+        now = now or time.time()
+        state = self.releases.get(release_id)
+        if state is None:
+            return
+        
+        if new_listings:
+            state['recent_new'] += new_listings
+            state['last_new_at'] = now
+        
+        state['interval'] = self.interval_for(state, now)
+        state['next_due'] = now + state['interval']
+        heapq.heappush(self.heap, (state['next_due'], release_id))
+
+    def record_failure(self, release_id: str, now: float = None):
+        """Retry a release whose fetch failed after min_interval, keeping its interval."""
+        now = now or time.time()
+        state = self.releases.get(release_id)
+        if state is None:
+            return
+        
+        state['next_due'] = now + min(self.min_interval, state['interval'])
+        heapq.heappush(self.heap, (state['next_due'], release_id))
+
+    def set_favorite(self, release_id: str, favorite: bool, now: float = None):
+        now = now or time.time()
+        state = self.releases.get(release_id)
+        if state is None:
+            return
+        
+        state['favorite'] = favorite
+        state['interval'] = self.interval_for(state, now)
+        if state['next_due'] > now + state['interval']:
+            state['next_due'] = now + state['interval']
+            heapq.heappush(self.heap, (state['next_due'], release_id))
+
+    def calls_per_hour(self) -> float:
+        return sum(3600 / state['interval'] for state in self.releases.values())
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import List, Dict
+from config import Config
+from database import Database
+from discogs_client import DiscogsClient
+from filters import ListingFilter, parse_rates
+from rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 300
+IDLE_SECONDS = 0.5
+RULES_REFRESH_SECONDS = 30
+
+
+class ScanWorker:
+    """Fetches marketplace listings for releases claimed from scan_queue.
+
+    Runs in its own process with its own Discogs token and rate limiter.
+    Seen marks and outbox rows go straight into the shared database; the
+    main process schedules releases into the queue and delivers
+    notifications.
+    """
+
+    def __init__(self, name: str, db: Database, discogs: DiscogsClient, fetch_workers: int = 4):
+        self.name = name
+        self.db = db
+        self.discogs = discogs
+        self.fetch_slots = asyncio.Semaphore(fetch_workers)
+        self.batch_size = fetch_workers * 2
+        self.listing_filter = ListingFilter(parse_rates(Config.CURRENCY_RATES))
+        self.rules_loaded_at = 0.0
+        self.claimed = set()
+
+    async def run(self):
+        logger.info(f"Scan worker {self.name} started")
+        try:
+            while True:
+                claims = await asyncio.to_thread(
+                    self.db.claim_scans, self.name, self.batch_size, LEASE_SECONDS
+                )
+                if not claims:
+                    await asyncio.sleep(IDLE_SECONDS)
+                    continue
+                
+                await self.refresh_rules()
+                self.claimed.update(claim['release_id'] for claim in claims)
+                await asyncio.gather(*(self.scan(claim) for claim in claims))
+        finally:
+            if self.claimed:
+                # Hand unfinished work straight back instead of waiting
+                # for the lease to run out.
+                self.db.release_scans(list(self.claimed))
+
+    async def refresh_rules(self):
+        # /filter changes land in the main process; pick them up here too.
+        if time.monotonic() - self.rules_loaded_at >= RULES_REFRESH_SECONDS:
+            rules = await asyncio.to_thread(self.db.get_filter_rules)
+            self.listing_filter.load(rules)
+            self.rules_loaded_at = time.monotonic()
+
+    async def scan(self, claim: Dict):
+        release_id = claim['release_id']
+        
+        def reached_seen(listing_ids):
+            return asyncio.to_thread(self.db.reached_seen_listings, release_id, listing_ids)
+        
+        try:
+            async with self.fetch_slots:
+                listings, complete = await self.discogs.get_new_marketplace_listings(
+                    release_id, reached_seen, Config.MARKETPLACE_MAX_PAGES
+                )
+        except Exception as e:
+            # No checkpoint: the release is neither counted done nor
+            # stamped as polled, so it is fetched again soon.
+            logger.error(f"Worker {self.name} failed to fetch release {release_id}: {e}")
+            await asyncio.to_thread(self.db.fail_scan, release_id)
+            self.claimed.discard(release_id)
+            return
+        
+        try:
+            await asyncio.to_thread(
+                self.db.record_release_scan,
+                claim['item'],
+                listings,
+                claim['chat_ids'],
+                claim['cycle_id'],
+                listing_filter=self.listing_filter,
+                claimed=True,
+                rates=self.listing_filter.rates,
+                complete=complete
+            )
+        except Exception as e:
+            # The checkpoint rolled back. Letting this escape gather()
+            # would kill the process, and its restart would claim the
+            # same release and fail the same way.
+            logger.error(f"Worker {self.name} failed to record scan of release {release_id}: {e}")
+            await asyncio.to_thread(self.db.fail_scan, release_id)
+        self.claimed.discard(release_id)
+
+
+def run_worker(name: str, token: str, db_path: str):
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    async def main():
+        # terminate() from the pool sends SIGTERM; cancel so claims get released.
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        db = Database(db_path, seen_index_max=Config.SEEN_INDEX_MAX_ENTRIES, shared=True)
+        discogs = DiscogsClient(
+            token,
+            Config.DISCOGS_USERNAME,
+            RateLimiter(Config.DISCOGS_REQUESTS_PER_MINUTE),
+            max_connections=Config.FETCH_WORKERS,
+            base_url=Config.DISCOGS_API_URL
+        )
+        try:
+            await ScanWorker(name, db, discogs, Config.FETCH_WORKERS).run()
+        finally:
+            await discogs.close()
+            db.close()
+    
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+class ScanWorkerPool:
+    """One scan worker process per Discogs token, restarted if it dies."""
+
+    def __init__(self, tokens: List[str], db_path: str):
+        self.tokens = tokens
+        self.db_path = db_path
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def start(self):
+        for index in range(len(self.tokens)):
+            self.start_worker(index)
+
+    def start_worker(self, index: int):
+        name = f"scan-{index}"
+        process = self.context.Process(
+            target=run_worker,
+            args=(name, self.tokens[index], self.db_path),
+            name=name,
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started scan worker {name} (pid {process.pid})")
+
+    def ensure_alive(self):
+        for index, process in list(self.processes.items()):
+            if not process.is_alive():
+                logger.warning(f"Scan worker {process.name} exited with {process.exitcode}, restarting")
+                self.start_worker(index)
+
+    def stop(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=5)
+        self.processes = {}
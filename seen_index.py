@@ -0,0 +1,217 @@
+"""In-memory front for seen_listings lookups.
+
+Each (release_id, listing_id) pair is packed into one 64-bit integer
+(26 bits of release id, 38 bits of listing id, which covers every id
+Discogs has issued by a wide margin). Ids that do not fit, or are not
+numeric, are never indexed and always fall through to SQLite.
+
+While it has at most max_exact entries the index is exact: a sorted
+array('Q') of packed keys, answered by binary search, plus a set of recent
+adds that is merged into the array every MERGE_THRESHOLD keys. That costs
+8 bytes per listing (1M listings about 8 MB, 5M about 40 MB) plus about
+70 bytes per recent add, at most around 2 * MERGE_THRESHOLD of them (7 MB).
+Past max_exact the array is dropped for a Bloom filter at 1% false
+positives, sized for twice the count it was built from (about 2.4 bytes
+per listing, 24 MB per 10M), and "maybe seen" answers go to SQLite.
+
+A merge is split so the owner can run the slow part outside its lock:
+start_merge and finish_merge only swap references, while build_merge
+does the linear rebuild and touches nothing shared.
+
+Loading streams keys in LOAD_CHUNK batches straight into the array (or the
+filter), so it never needs more than the finished index plus one chunk of
+a few MB; no list or set of every key is built.
+"""
+import math
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Iterable, List, Optional
+
+RELEASE_BITS = 26
+LISTING_BITS = 38
+MERGE_THRESHOLD = 50_000
+LOAD_CHUNK = 100_000
+MASK64 = (1 << 64) - 1
+
+
+def pack_key(release_id, listing_id) -> Optional[int]:
+    try:
+        release = int(release_id)
+        listing = int(listing_id)
+    except (TypeError, ValueError):
+        return None
+    if not (0 <= release < 1 << RELEASE_BITS and 0 <= listing < 1 << LISTING_BITS):
+        return None
+    return release << LISTING_BITS | listing
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: int) -> List[int]:
+        # Double hashing over two multiplicative mixes of the packed key;
+        # much cheaper than a cryptographic digest and good enough here.
+        h1 = ((key ^ (key >> 29)) * 0x9E3779B97F4A7C15) & MASK64
+        h2 = ((key ^ (key >> 31)) * 0xBF58476D1CE4E5B9 & MASK64) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: int):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def add_many(self, keys: Iterable[int]):
+        # add() with the hashing inlined, for building a filter from
+        # millions of keys when the exact array is dropped.
+        bits = self.bits
+        size = self.size
+        hashes = range(self.hashes)
+        for key in keys:
+            h1 = ((key ^ (key >> 29)) * 0x9E3779B97F4A7C15) & MASK64
+            h2 = ((key ^ (key >> 31)) * 0xBF58476D1CE4E5B9 & MASK64) | 1
+            for i in hashes:
+                pos = (h1 + i * h2) % size
+                bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: int) -> bool:
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SeenIndex:
+    def __init__(self, max_exact: int = 5_000_000, error_rate: float = 0.01):
+        self.max_exact = max_exact
+        self.error_rate = error_rate
+        self.exact = True
+        self.loaded = False
+        self.count = 0
+        self.bloom = None
+        self.base = array('Q')
+        self.recent = set()
+        # Keys taken out of recent by start_merge, until finish_merge.
+        self.merging = set()
+
+    def load(self, keys: Iterable[int], expected: int = None):
+        """Build the index from keys, which must be sorted and unique.
+
+        seen_listings read in primary-key order already is, so keys are
+        streamed in as they come. expected, when known, says up front
+        whether the index will be exact and sizes the Bloom filter if not.
+        """
+        self.exact = expected is None or expected <= self.max_exact
+        self.bloom = None if self.exact else BloomFilter(max(100_000, 2 * expected), self.error_rate)
+        self.recent = set()
+        self.merging = set()
+        base = array('Q')
+        count = 0
+        
+        keys = iter(keys)
+        while True:
+            chunk = array('Q', islice(keys, LOAD_CHUNK))
+            if not chunk:
+                break
+            count += len(chunk)
+            if not self.exact:
+                self.bloom.add_many(chunk)
+                continue
+            base.extend(chunk)
+            if len(base) > self.max_exact:
+                self._drop_exact(base)
+                base = array('Q')
+        
+        self.count = count
+        self.base = base
+        self.loaded = True
+
+    def add(self, key: int):
+        if not self.exact:
+            self.count += 1
+            self.bloom.add(key)
+            return
+        
+        if self._in_exact(key):
+            return
+        self.count += 1
+        self.recent.add(key)
+
+    def lookup(self, key: int) -> Optional[bool]:
+        """False: never seen. True: seen. None: unknown, ask SQLite."""
+        if not self.loaded:
+            return None
+        if self.exact:
+            return self._in_exact(key)
+        return None if key in self.bloom else False
+
+    def _in_exact(self, key: int) -> bool:
+        if key in self.recent or key in self.merging:
+            return True
+        i = bisect_left(self.base, key)
+        return i < len(self.base) and self.base[i] == key
+
+    @property
+    def merge_due(self) -> bool:
+        return self.exact and not self.merging and len(self.recent) >= MERGE_THRESHOLD
+
+    def start_merge(self) -> tuple:
+        """Freeze the recent adds; returns the arguments for build_merge."""
+        self.merging, self.recent = self.recent, set()
+        return self.base, self.merging, self.max_exact, self.error_rate
+
+    @staticmethod
+    def build_merge(base: array, keys: Iterable[int], max_exact: int, error_rate: float) -> tuple:
+        """Merge keys (none already in base) into a new sorted array.
+
+        Linear: the slices of base between insertion points are copied
+        whole, so only len(keys) steps run in Python. Returns (array, None),
+        or (None, filter) when the result is too big to keep exact.
+        """
+        merged = array('Q')
+        start = 0
+        for key in sorted(keys):
+            end = bisect_left(base, key, start)
+            merged.extend(base[start:end])
+            merged.append(key)
+            start = end
+        merged.extend(base[start:])
+        
+        if len(merged) <= max_exact:
+            return merged, None
+        return None, _bloom_from(merged, error_rate)
+
+    def finish_merge(self, merged: Optional[array], bloom: Optional[BloomFilter]):
+        self.merging = set()
+        if bloom is None:
+            self.base = merged
+            return
+        # Dropped: the filter is sized from the merge and simply saturates
+        # slowly from here on.
+        bloom.add_many(self.recent)
+        self.bloom = bloom
+        self.exact = False
+        self.base = array('Q')
+        self.recent = set()
+
+    def _drop_exact(self, keys: array):
+        self.bloom = _bloom_from(keys, self.error_rate)
+        self.exact = False
+
+    def memory_bytes(self) -> int:
+        bloom = len(self.bloom.bits) if self.bloom else 0
+        recent = len(self.recent) + len(self.merging)
+        return bloom + self.base.itemsize * len(self.base) + 70 * recent
+
+
+def _bloom_from(keys: array, error_rate: float) -> BloomFilter:
+    bloom = BloomFilter(max(100_000, 2 * len(keys)), error_rate)
+    bloom.add_many(keys)
+    return bloom
@@ -0,0 +1,81 @@
+import asyncio
+import time
+import logging
+from typing import List, Dict
+
+logger = logging.getLogger(__name__)
+
+FULL_SYNC_STATE_KEY = 'wantlist_full_sync_at'
+
+
+class WantlistSync:
+    """Keeps user_wants and wantlist_cache in step with each subscriber's Discogs wantlist.
+
+    Most cycles only read pages (newest first) until one contains a release
+    we already know for that user, which on a stable wantlist is the first
+    page. Removals can only be seen by walking everything, so that happens
+    every full_sync_hours. wantlist_cache ends up as the union of all users'
+    releases, which is what gets polled.
+    """
+
+    def __init__(self, db, discogs, full_sync_hours: float = 24, owner_username: str = None):
+        self.db = db
+        self.discogs = discogs
+        self.full_sync_seconds = full_sync_hours * 3600
+        self.owner_username = owner_username
+
+    def full_sync_due(self, username: str, known: set) -> bool:
+        last_full = self.db.get_state(f"{FULL_SYNC_STATE_KEY}:{username}")
+        return not known or last_full is None or time.time() - float(last_full) >= self.full_sync_seconds
+
+    async def sync(self) -> List[Dict]:
+        usernames = await asyncio.to_thread(self.db.get_active_usernames)
+        if self.owner_username and self.owner_username not in usernames:
+            usernames.append(self.owner_username)
+        
+        for username in usernames:
+            try:
+                await self.sync_user(username)
+            except Exception as e:
+                logger.error(f"Error syncing wantlist for {username}: {e}")
+        
+        await asyncio.to_thread(self.db.prune_wantlist_cache)
+        return await asyncio.to_thread(self.db.get_cached_wantlist, usernames)
+
+    async def sync_user(self, username: str):
+        known = await asyncio.to_thread(self.db.get_user_release_ids, username)
+        
+        if await asyncio.to_thread(self.full_sync_due, username, known):
+            await self.full_sync(username, known)
+        else:
+            await self.incremental_sync(username, known)
+
+    async def incremental_sync(self, username: str, known: set):
+        new_items = []
+        pages = 0
+        
+        async for page in self.discogs.iter_wantlist_pages(username):
+            pages += 1
+            fresh = [item for item in page if item['release_id'] not in known]
+            new_items.extend(fresh)
+            if len(fresh) < len(page):
+                break
+        
+        await asyncio.to_thread(self.db.upsert_wantlist_items, new_items)
+        added = await asyncio.to_thread(self.db.add_user_wants, username, new_items)
+        logger.info(f"Incremental wantlist sync for {username}: {pages} page(s), {added} new item(s)")
+
+    async def full_sync(self, username: str, known: set):
+        items = await self.discogs.get_wantlist(username)
+        current = {item['release_id'] for item in items}
+        removed = list(known - current)
+        
+        written = await asyncio.to_thread(self.db.upsert_wantlist_items, items)
+        await asyncio.to_thread(self.db.add_user_wants, username, items)
+        deleted = await asyncio.to_thread(self.db.remove_user_wants, username, removed)
+        await asyncio.to_thread(self.db.set_state, f"{FULL_SYNC_STATE_KEY}:{username}", str(time.time()))
+        
+        logger.info(
+            f"Full wantlist sync for {username}: {len(items)} item(s), "
+            f"{written} written, {deleted} removed"
+        )
@@ -0,0 +1,160 @@
+"""Webhook mode: Telegram pushes updates to an ASGI endpoint in this process.
+
+One uvicorn server, on the bot's own event loop, takes the place of both
+updater.start_polling and the keep-alive Flask thread. It serves
+
+    POST /telegram   updates from Telegram, checked against the secret token
+    GET  /metrics    Prometheus metrics
+    GET  /           the keep-alive page
+
+Updates go straight onto the Application's update_queue, so handlers run
+exactly as they do when polling; the request is answered as soon as the
+update is queued.
+"""
+import asyncio
+import hmac
+import importlib.util
+import json
+import logging
+from telegram import Update
+import metrics
+
+# uvicorn is imported when a WebhookServer is built, so polling mode (and
+# keep_alive, which shares HOME_PAGE) never pays for it.
+UVICORN_AVAILABLE = importlib.util.find_spec('uvicorn') is not None
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = '/telegram'
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+# Telegram updates are a few KB; anything this large is not from Telegram.
+MAX_BODY_BYTES = 1 << 20
+
+HOME_PAGE = """
+    <html>
+        <head><title>Discogs Bot</title></head>
+        <body>
+            <h1>🎵 Discogs Wantlist Bot</h1>
+            <p>✅ Bot is active and monitoring your wantlist!</p>
+        </body>
+    </html>
+    """
+
+
+async def _respond(send, status: int, body: bytes = b'', content_type: str = 'text/plain'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+class WebhookApp:
+    """Bare ASGI app; three routes do not need a framework."""
+
+    def __init__(self, application, secret: str):
+        self.application = application
+        self.secret = secret.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        method, path = scope['method'], scope['path']
+        
+        if path == WEBHOOK_PATH and method == 'POST':
+            status = await self.handle_update(scope, receive)
+            await _respond(send, status)
+        elif path == '/metrics' and method == 'GET':
+            body, content_type = metrics.render()
+            await _respond(send, 200, body, content_type)
+        elif path == '/' and method in ('GET', 'HEAD'):
+            await _respond(send, 200, HOME_PAGE.encode(), 'text/html; charset=utf-8')
+        else:
+            await _respond(send, 404)
+
+    async def handle_update(self, scope, receive) -> int:
+        token = dict(scope['headers']).get(SECRET_HEADER, b'')
+        if not hmac.compare_digest(token, self.secret):
+            metrics.WEBHOOK_UPDATES.labels('forbidden').inc()
+            return 403
+        
+        body = await _read_body(receive)
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot) if body else None
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            update = None
+        if update is None:
+            metrics.WEBHOOK_UPDATES.labels('malformed').inc()
+            return 400
+        
+        await self.application.update_queue.put(update)
+        metrics.WEBHOOK_UPDATES.labels('accepted').inc()
+        return 200
+
+
+class WebhookServer:
+    def __init__(self, application, url: str, secret: str, port: int = 3000,
+                 host: str = '0.0.0.0'):
+        if not UVICORN_AVAILABLE:
+            raise RuntimeError("uvicorn is not installed; install it or unset TELEGRAM_WEBHOOK_URL")
+        import uvicorn
+        
+        self.application = application
+        self.url = f"{url.rstrip('/')}{WEBHOOK_PATH}"
+        self.secret = secret
+        self.server = uvicorn.Server(uvicorn.Config(
+            WebhookApp(application, secret),
+            host=host,
+            port=port,
+            lifespan='off',
+            access_log=False,
+            log_level='warning'
+        ))
+        # The bot owns Ctrl+C / SIGTERM and stops the server itself.
+        self.server.install_signal_handlers = lambda: None
+        self.task = None
+
+    async def start(self):
+        """Start serving, then point Telegram at us; the Application must be started."""
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            if self.task.done():
+                self.task.result()
+                raise RuntimeError("Webhook server stopped during startup")
+            await asyncio.sleep(0.05)
+        
+        await self.application.bot.set_webhook(
+            url=self.url,
+            secret_token=self.secret,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"Receiving Telegram updates at {self.url} (port {self.server.config.port})")
+
+    async def stop(self):
+        # The webhook stays registered: Telegram holds updates until we are back.
+        if self.task is None:
+            return
+        self.server.should_exit = True
+        await self.task
+        self.task = None